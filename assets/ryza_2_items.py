@@ -1,5 +1,4 @@
 import csv
-import pandas as pd
 
 # CSV Columns:
 # name
@@ -42,27 +41,27 @@ import pandas as pd
 # ingredient_set/23/ing
 
 def merge_ingredient_columns(filename: str) -> None:
-	new_rows = []
-	with open(filename, newline='') as csvfile:
+	# Rows are converted and written one at a time, so the file is never held in memory.
+	# `main.py ingest --format=datamined` reads such dumps directly, without converting.
+	filename_without_extension = filename.split(".")[0]
+	with open(filename, newline='') as csvfile, \
+		open(filename_without_extension + "_conv.csv", "w", newline='') as convfile:
 		reader = csv.DictReader(csvfile, delimiter=',', quotechar='"')
+		ingredient_columns = [column for column in reader.fieldnames or []
+		                      if column.startswith("ingredient_set/") and column.endswith("/ing")]
+		# One Ingredient N column per ingredient_set/n/ing column at most
+		writer = csv.DictWriter(convfile, ["Name", "Type"] + [
+			f"Ingredient {i + 1}" for i in range(len(ingredient_columns))])
+		writer.writeheader()
 		for row in reader:
 			new_row = {"Name": row["name"], "Type": row["Type"]}
-			# merge ingredient_set/n/ing
-			# first find the unique ingredient_set/n/ing values
-			ingredient_values = set()
-			for column in row.keys():
-				if column.startswith("ingredient_set/") and column.endswith("/ing"):
-					if row[column] != "":
-						ingredient_values.add(row[column])
-					# Adds new columns Ingredient 1, Ingredient 2, etc.
-					# for each unique ingredient_set/n/ing value
-					for i, ingredient in enumerate(ingredient_values):
-						new_row[f"Ingredient {i+1}"] = ingredient
-			new_rows.append(new_row)
-	# write the new file
-	df = pd.DataFrame(new_rows)
-	filename_without_extension = filename.split(".")[0]
-	df.to_csv(filename_without_extension + "_conv.csv", index=False, header=True)
+			# merge ingredient_set/n/ing: each unique value, in column order, becomes one of
+			# the new columns Ingredient 1, Ingredient 2, etc.
+			ingredient_values = dict.fromkeys(row[column] for column in ingredient_columns
+			                                  if row[column] != "")
+			for i, ingredient in enumerate(ingredient_values):
+				new_row[f"Ingredient {i+1}"] = ingredient
+			writer.writerow(new_row)
 
 if __name__ == "__main__":
 	merge_ingredient_columns("ryza_2_items.csv")
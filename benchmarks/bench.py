@@ -0,0 +1,174 @@
+"""
+Benchmarks of the loop finder on the bundled catalogs and on a synthetic one.
+
+Each benchmark is run {--repeat} times and its min and median wall-clock times are
+written as json, along with the git commit, so runs can be compared across commits:
+
+    python benchmarks/bench.py -o before.json
+    git checkout other-branch
+    python benchmarks/bench.py -o after.json --compare before.json
+"""
+from __future__ import annotations
+
+import io
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import click
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import main
+import model
+from synthetic import generate_catalog, write_catalog_csv
+
+def time_runs(benchmark: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		benchmark()
+		times.append(time.perf_counter() - start)
+	return {"runs": repeat, "min_s": min(times), "median_s": statistics.median(times)}
+
+def catalog_benchmarks(csv_files: Sequence[str], strategy: Callable[..., model.Model],
+                       loop_size: int) -> List[Tuple[str, Callable[[], Any]]]:
+	"""The benchmarks to run on the catalog loaded from {csv_files} with {strategy}."""
+	items = model.load_csv_files(csv_files, strategy).items
+	graph = model.graph_of(items)
+	loop_ids = model.find_cycle_ids(graph, loop_size)
+	loops = [graph.items_of(loop) for loop in loop_ids]
+
+	def is_used_as_ingredient_of() -> None:
+		for item in items:
+			main.find_is_used_as_ingredient_of(item, items)
+
+	index = model.SearchIndex(graph)
+
+	def search() -> None:
+		for item in items:
+			index.name_contains(item.Name[:4])
+			for t in item.Type:
+				index.of_category(t)
+		index.fuzzy_names("Natrual Cloth")
+
+	def format_loops() -> None:
+		for loop in loops:
+			main.explain_loop(loop, graph)
+		main.describe_items(items)
+
+	def write_jsonl() -> None:
+		with model.LoopWriter(io.StringIO(), graph, "jsonl") as writer:
+			for loop in loop_ids:
+				writer.write(loop)
+
+	return [
+		("load_csv", lambda: model.load_csv_files(csv_files, strategy)),
+		("build_graph", lambda: model.RecipeGraph(items)),
+		("find_is_used_as_ingredient_of", is_used_as_ingredient_of),
+		("find_bidirectional_related_pairs",
+		 lambda: main.find_bidirectional_related_pairs(items)),
+		("build_search_index", lambda: model.SearchIndex(graph)),
+		("search", search),
+		(f"find_looping_sequences_{loop_size}",
+		 lambda: main.find_looping_sequences([], loop_size, [], items)),
+		(f"iter_cycle_ids_{loop_size}", lambda: sum(1 for _ in model.iter_cycle_ids(
+			graph, loop_size))),
+		(f"best_cycle_ids_{loop_size}",
+		 lambda: model.best_cycle_ids(graph, model.item_scores(items), 10, loop_size)),
+		("shortest_paths", lambda: [model.shortest_path_ids(graph, 0, i, 6)
+		                            for i in range(1, graph.size)]),
+		("components", lambda: model.Components(graph)),
+		(f"loop_upper_bound_{loop_size}",
+		 lambda: model.WalkMatrix(graph).loop_upper_bound(loop_size)),
+		("format_output", format_loops),
+		("write_jsonl", write_jsonl),
+	]
+
+def git_commit() -> str | None:
+	try:
+		return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True,
+		                      capture_output=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def compare(results: List[Dict[str, Any]], baseline_file: str) -> None:
+	"""Print the median time of each benchmark relative to {baseline_file}'s."""
+	baseline = json.loads(Path(baseline_file).read_text())
+	before = {(r["catalog"], r["benchmark"]): r["median_s"] for r in baseline["results"]}
+	for r in results:
+		key = (r["catalog"], r["benchmark"])
+		if key not in before:
+			continue
+		ratio = r["median_s"] / before[key] if before[key] > 0 else float("inf")
+		color = "red" if ratio > 1.1 else "green" if ratio < 0.9 else None
+		click.echo(f"{r['catalog']:<12} {r['benchmark']:<36} "
+		           + click.style(f"{ratio:6.2f}x", fg=color), err=True)
+
+@click.command()
+@click.option("--repeat", "-r", default=5, show_default=True,
+              help="Runs per benchmark")
+@click.option("--loop-size", "-s", default=3, show_default=True,
+              help="Loop size searched by the loop benchmarks")
+@click.option("--items", default=300, show_default=True,
+              help="Items of the synthetic catalog")
+@click.option("--categories", default=30, show_default=True,
+              help="Categories of the synthetic catalog")
+@click.option("--fanout", default=2, show_default=True,
+              help="Categories per synthetic item")
+@click.option("--ingredients", default=4, show_default=True,
+              help="Ingredients per synthetic recipe")
+@click.option("--seed", default=0, show_default=True,
+              help="Seed of the synthetic catalog")
+@click.option("--only", "-k", default=None,
+              help="Only run the benchmarks whose name contains this")
+@click.option("--output", "-o", type=click.Path(dir_okay=False), default=None,
+              help="Write the results to this json file instead of stdout")
+@click.option("--compare", "baseline", type=click.Path(exists=True, dir_okay=False),
+              default=None, help="Print the change against a previous results file")
+def bench(repeat: int, loop_size: int, items: int, categories: int, fanout: int,
+          ingredients: int, seed: int, only: str | None, output: str | None,
+          baseline: str | None) -> None:
+	# name -> (csv files, load strategy) of the bundled games and the synthetic catalog
+	catalogs = {name: (game.files, game.strategy) for name, game in model.GAMES.items()}
+	with tempfile.TemporaryDirectory() as tmp:
+		synthetic_csv = Path(tmp) / "synthetic.csv"
+		write_catalog_csv(generate_catalog(items, categories, fanout, ingredients,
+		                                   seed=seed), synthetic_csv)
+		catalogs["synthetic"] = ((str(synthetic_csv),), model.ryza_2_csv_load_strategy)
+
+		results = []
+		for catalog_name, (csv_files, strategy) in catalogs.items():
+			for name, benchmark in catalog_benchmarks(csv_files, strategy, loop_size):
+				if only is not None and only not in name:
+					continue
+				result = {"catalog": catalog_name, "benchmark": name,
+				          **time_runs(benchmark, repeat)}
+				click.echo(f"{catalog_name:<12} {name:<36} {result['median_s']:.4f}s",
+				           err=True)
+				results.append(result)
+
+	report = {
+		"commit": git_commit(),
+		"python": sys.version.split()[0],
+		"parameters": {"repeat": repeat, "loop_size": loop_size, "items": items,
+		               "categories": categories, "fanout": fanout,
+		               "ingredients": ingredients, "seed": seed},
+		"results": results,
+	}
+	text = json.dumps(report, indent=2)
+	if output is None:
+		click.echo(text)
+	else:
+		Path(output).write_text(text + "\n")
+	if baseline is not None:
+		compare(results, baseline)
+
+if __name__ == "__main__":
+	bench()
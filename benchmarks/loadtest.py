@@ -0,0 +1,130 @@
+"""
+Load test of the LoopFinder service API: the same mix of uses, search and loops
+queries is answered at each concurrency level, from one loaded catalog, reporting the
+throughput, the latencies, the queries coalesced with an identical one in flight, and
+how late the event loop ran a 10ms heartbeat (how long it was blocked).
+
+Usage: python benchmarks/loadtest.py [--queries N] [-c 1 -c 8 ...] [--output load.json]
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import click
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import model
+
+HEARTBEAT_S = 0.01
+
+def query_mix(graph: model.RecipeGraph, count: int, seed: int) -> List[model.Query]:
+	"""
+	{count} queries drawn from a pool of distinct ones, so popular queries are repeated
+	as they would be by the clients of a service: uses and search queries of a few items,
+	and the loops of 3 items through them, and of 4 and 5 items through some of them.
+	"""
+	rng = random.Random(seed)
+	components = model.components_of(graph)
+	on_loops = [item.Name for i, item in enumerate(graph.items) if components.on_loops(i)]
+	names = rng.sample(on_loops, min(20, len(on_loops)))
+	pool: List[model.Query] = []
+	for name in names:
+		pool.append(model.UsesQuery(name))
+		pool.append(model.SearchQuery(name[:4]))
+		pool.append(model.LoopsQuery(size=3, start=name))
+	for name in names[:5]:
+		pool.append(model.LoopsQuery(size=4, start=name, limit=200))
+	for name in names[:2]:
+		pool.append(model.LoopsQuery(size=5, start=name, limit=1000))
+	return [rng.choice(pool) for _ in range(count)]
+
+async def heartbeat(lags: List[float], stop: asyncio.Event) -> None:
+	"""Record how late each {HEARTBEAT_S} sleep wakes up, until {stop} is set."""
+	loop = asyncio.get_running_loop()
+	while not stop.is_set():
+		start = loop.time()
+		await asyncio.sleep(HEARTBEAT_S)
+		lags.append(loop.time() - start - HEARTBEAT_S)
+
+async def run_level(finder: model.LoopFinder, queries: List[model.Query],
+                    concurrency: int) -> Dict[str, Any]:
+	"""Answer {queries} with {concurrency} clients, each asking one query at a time."""
+	pending = iter(queries)
+	latencies: List[float] = []
+	lags: List[float] = []
+
+	async def client() -> None:
+		for query in pending:
+			start = time.perf_counter()
+			await finder.query(query)
+			latencies.append(time.perf_counter() - start)
+
+	finder.queries = finder.coalesced = 0
+	stop = asyncio.Event()
+	beat = asyncio.ensure_future(heartbeat(lags, stop))
+	start = time.perf_counter()
+	await asyncio.gather(*(client() for _ in range(concurrency)))
+	seconds = time.perf_counter() - start
+	stop.set()
+	await beat
+	latencies.sort()
+	return {
+		"concurrency": concurrency,
+		"queries": len(queries),
+		"seconds": seconds,
+		"queries_per_s": len(queries) / seconds,
+		"p50_ms": 1000 * statistics.median(latencies),
+		"p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+		"coalesced": finder.coalesced,
+		"max_loop_lag_ms": 1000 * max(lags, default=0.0),
+	}
+
+async def load_test(game: str, count: int, levels: Tuple[int, ...], workers: int | None,
+                    seed: int) -> Dict[str, Any]:
+	async with model.LoopFinder(game, max_workers=workers) as finder:
+		start = time.perf_counter()
+		graph, _ = await finder.catalog()
+		load_s = time.perf_counter() - start
+		queries = query_mix(graph, count, seed)
+		results = [await run_level(finder, queries, c) for c in levels]
+	return {"python": sys.version.split()[0], "game": game, "load_s": load_s,
+	        "workers": workers, "levels": results}
+
+@click.command()
+@click.option("--game", "-g", type=click.Choice(sorted(model.GAMES)),
+              default=model.DEFAULT_GAME, show_default=True, help="The catalog to query")
+@click.option("--queries", "-n", "count", default=200, show_default=True,
+              help="Queries answered at each concurrency level")
+@click.option("--concurrency", "-c", "levels", type=int, multiple=True,
+              default=[1, 2, 4, 8, 16, 32], show_default=True,
+              help="Clients asking queries at the same time, for each level")
+@click.option("--workers", "-w", type=int, default=None,
+              help="Threads of the executor running the loop searches [default: "
+                   "the ThreadPoolExecutor default]")
+@click.option("--seed", default=0, show_default=True, help="Seed of the query mix")
+@click.option("--output", "-o", type=click.Path(dir_okay=False), default=None,
+              help="Also write the results to this json file")
+def loadtest(game: str, count: int, levels: Tuple[int, ...], workers: int | None,
+             seed: int, output: str | None) -> None:
+	results = asyncio.run(load_test(game, count, levels, workers, seed))
+	click.echo(f"Loaded {game} in {results['load_s']:.3f}s, {count} queries per level")
+	click.echo(f"{'clients':>7} {'queries/s':>10} {'p50 ms':>8} {'p95 ms':>8} "
+	           f"{'coalesced':>9} {'max lag ms':>10}")
+	for level in results["levels"]:
+		click.echo(f"{level['concurrency']:>7} {level['queries_per_s']:>10.1f} "
+		           f"{level['p50_ms']:>8.2f} {level['p95_ms']:>8.2f} "
+		           f"{level['coalesced']:>9} {level['max_loop_lag_ms']:>10.2f}")
+	if output is not None:
+		Path(output).write_text(json.dumps(results, indent=2) + "\n")
+
+if __name__ == "__main__":
+	loadtest()
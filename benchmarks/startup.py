@@ -0,0 +1,75 @@
+"""
+Cold-start benchmark of the cli: `python -X importtime` of `main.py --help`, plus the
+wall-clock time of `--help` and `search` invocations.
+
+Usage: python benchmarks/startup.py [--runs N] [--output startup.json]
+"""
+from __future__ import annotations
+
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import click
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def run_cli(*args: str) -> subprocess.CompletedProcess[str]:
+	return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True,
+	                      check=True)
+
+def import_times(top: int) -> Dict[str, Any]:
+	"""
+	Parse `-X importtime` of `main.py --help` into the total import time and the {top}
+	slowest top-level imports, in microseconds.
+	"""
+	stderr = run_cli("-X", "importtime", "main.py", "--help").stderr
+	imports = []
+	for line in stderr.splitlines():
+		if not line.startswith("import time:") or "self [us]" in line:
+			continue
+		_, cumulative_us, name = line.split("|")
+		# top-level imports are the ones without indentation in the import tree
+		if not name.startswith("  "):
+			imports.append((name.strip(), int(cumulative_us)))
+	imports.sort(key=lambda x: -x[1])
+	return {
+		"total_us": sum(us for _, us in imports),
+		"slowest": [{"module": name, "cumulative_us": us} for name, us in imports[:top]],
+	}
+
+def wall_times(args: List[str], runs: int) -> Dict[str, float]:
+	"""Min and median wall-clock seconds of {runs} fresh `python main.py {args}`."""
+	times = []
+	for _ in range(runs):
+		start = time.perf_counter()
+		run_cli("main.py", *args)
+		times.append(time.perf_counter() - start)
+	return {"min_s": min(times), "median_s": statistics.median(times)}
+
+@click.command()
+@click.option("--runs", "-n", default=10, show_default=True,
+              help="Invocations timed per command")
+@click.option("--top", default=10, show_default=True,
+              help="Number of slowest imports to report")
+@click.option("--output", "-o", type=click.Path(dir_okay=False), default=None,
+              help="Write the results to this json file instead of stdout")
+def startup(runs: int, top: int, output: str | None) -> None:
+	results = {
+		"python": sys.version.split()[0],
+		"importtime": import_times(top),
+		"help": wall_times(["--help"], runs),
+		"search": wall_times(["search", "cloth"], runs),
+	}
+	text = json.dumps(results, indent=2)
+	if output is None:
+		click.echo(text)
+	else:
+		Path(output).write_text(text + "\n")
+
+if __name__ == "__main__":
+	startup()
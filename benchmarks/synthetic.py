@@ -0,0 +1,90 @@
+"""
+Synthetic recipe catalogs for benchmarks, with configurable item count, category fan-out
+and ingredient count.
+"""
+from __future__ import annotations
+
+import csv
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import model
+
+def generate_catalog(items: int = 500, categories: int = 40, fanout: int = 2,
+                     ingredients: int = 4, category_ratio: float = 0.5,
+                     effect_ratio: float = 0.1, seed: int = 0) -> model.Model:
+	"""
+	Generate a catalog of {items} items named "Item N", each belonging to {fanout} of
+	{categories} categories named "(Category N)" and crafted from {ingredients}
+	ingredients. Each ingredient is a category with probability {category_ratio}, and an
+	item otherwise. Same arguments, same catalog.
+	"""
+	rng = random.Random(seed)
+	names = [f"Item {i}" for i in range(items)]
+	category_names = [f"(Category {i})" for i in range(categories)]
+	effects = ["Synth Quantity +1", "Synth Quantity +2", "Effect Spread +1",
+	           "Effect Spread +2", "Effect Spread +3"]
+	catalog = model.Model(items=[])
+	for name in names:
+		recipe = []
+		for _ in range(ingredients):
+			pool = category_names if rng.random() < category_ratio else names
+			ingredient = rng.choice(pool)
+			if ingredient != name and ingredient not in recipe:
+				recipe.append(ingredient)
+		catalog.items.append(model.Item(
+			Name=name,
+			Type=rng.sample(category_names, min(fanout, categories)),
+			Recipe=recipe,
+			Effects=[rng.choice(effects)] if rng.random() < effect_ratio else []))
+	return catalog
+
+def write_catalog_csv(catalog: model.Model, file: Path | str) -> None:
+	"""
+	Write {catalog} in the ryza_2_csv_load_strategy format (up to 4 categories plus 2
+	additional ones, and any number of "Ingredient N" columns).
+	"""
+	ingredient_count = max((len(item.Recipe) for item in catalog.items), default=0)
+	type_columns = ["Category 1", "Category 2", "Category 3", "Category 4",
+	                "Add Category 1", "Add Category 2"]
+	recipe_columns = [f"Ingredient {i + 1}" for i in range(ingredient_count)]
+	effect_columns = {"Synth Quantity": "SQ", "Effect Spread": "ES"}
+	with open(file, "w", newline='') as csvfile:
+		writer = csv.DictWriter(csvfile, ["Name", *type_columns, "ES", "SQ", "EV",
+		                                  *recipe_columns])
+		writer.writeheader()
+		for item in catalog.items:
+			row = {"Name": item.Name}
+			row.update(zip(type_columns, item.Type))
+			row.update(zip(recipe_columns, item.Recipe))
+			for effect in item.Effects:
+				label, value = effect.rsplit(" +", 1)
+				row[effect_columns[label]] = value
+			writer.writerow(row)
+
+def write_datamined_csv(catalog: model.Model, file: Path | str, ingredient_sets: int = 24,
+                        seed: int = 0) -> None:
+	"""
+	Write {catalog} as a data-mined item dump (see model.datamined_csv_row_parser): the
+	first category in "Category 1", the others in "category/N/name", and each recipe
+	spread over {ingredient_sets} "ingredient_set/N/ing" columns, with its ingredients
+	repeated across sets as in the game data.
+	"""
+	rng = random.Random(seed)
+	category_columns = [f"category/{i}/name" for i in range(1, 4)]
+	set_columns = [f"ingredient_set/{i}/ing" for i in range(ingredient_sets)]
+	with open(file, "w", newline='') as csvfile:
+		writer = csv.DictWriter(csvfile, ["name", "Type", "Category 1", *category_columns,
+		                                  *set_columns])
+		writer.writeheader()
+		for item in catalog.items:
+			row = {"name": item.Name, "Type": "Material" if not item.Recipe else "Synthesis"}
+			row.update(zip(["Category 1", *category_columns], item.Type))
+			if item.Recipe:
+				row.update(zip(set_columns, item.Recipe))
+				for column in set_columns[len(item.Recipe):]:
+					row[column] = rng.choice(item.Recipe)
+			writer.writerow(row)
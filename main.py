@@ -1,10 +1,21 @@
+from __future__ import annotations
+
+import os
+import shlex
+import sys
+import time
 from dataclasses import dataclass
-from typing import List, Tuple, TypeVar
+from functools import lru_cache
+from itertools import islice
+from typing import (TYPE_CHECKING, AbstractSet, Any, Dict, Iterable, Iterator, List, Set, Tuple,
+                    TypeVar)
 
 import click
 
 import model
-from model import Item, Model
+if TYPE_CHECKING:
+	from model import (CachedCatalog, CatalogCache, Game, IncrementalCatalog, Item,
+	                   LoopWriter, RecipeGraph)
 
 # A loop is a special kind of sequence where the last item uses the first item
 # The item type is the same as item category
@@ -22,19 +33,54 @@ class UsesRelation:
 	MatchingIngredientRequirement: str
 	MatchingIngredientType: str
 
+# Whether explanations are styled with ANSI colors, turned off by the cli when its
+# output isn't a terminal
+color_output = True
+
+def set_color_output(enabled: bool) -> None:
+	global color_output
+	if enabled != color_output:
+		color_output = enabled
+		explain_edge.cache_clear()
+
+def style(text: str, **styles: Any) -> str:
+	"""click.style, or {text} as is when the output isn't styled."""
+	return click.style(text, **styles) if color_output else text
+
 def item_uses_ingredient(item: model.Item, ingredient: model.Item) -> UsesRelation:
 	"""
 	Given an item and an ingredient, check if the item uses the ingredient as an
 	ingredient.
 	If the item uses the ingredient, return the UsesRelation.
 	"""
-	if ingredient.Name in item.Recipe:
-		return UsesRelation(item, ingredient, ingredient.Name, ingredient.Name)
-	for t in ingredient.Type:
-		for i in item.Recipe:
-			if i in t:
-				return UsesRelation(item, ingredient, t, i)
-	raise ValueError(f"{item.Name} does not use {ingredient.Name}")
+	label = model.uses_label(item, ingredient)
+	if label is None:
+		raise ValueError(f"{item.Name} does not use {ingredient.Name}")
+	return UsesRelation(item, ingredient, *label)
+
+def relation_of(item: model.Item, ingredient: model.Item,
+                graph: RecipeGraph | None = None) -> UsesRelation:
+	"""
+	item_uses_ingredient, with the relation taken from the edge labels of {graph} when
+	it indexes both items.
+	"""
+	if graph is not None:
+		label = graph.edge_labels.get((graph.position.get(item.Name, -1),
+		                               graph.position.get(ingredient.Name, -1)))
+		if label is not None:
+			return UsesRelation(item, ingredient, *label)
+	return item_uses_ingredient(item, ingredient)
+
+@lru_cache(maxsize=65536)
+def explain_edge(ingredient_name: str, requirement: str, matching_type: str,
+                 item_name: str) -> str:
+	"""
+	Explain one step of a loop, {item_name} using {ingredient_name}. The same steps
+	appear in many loops, so they are styled once.
+	"""
+	return ingredient_name + style(f'[{requirement}]', fg='magenta') \
+	       + style(' -> ', fg='blue') + style(f'[{matching_type}]', fg='magenta') \
+	       + item_name
 
 def explain_relation(item_a: model.Item, item_b: model.Item) -> str:
 	"""
@@ -70,86 +116,73 @@ def explain_relation(item_a: model.Item, item_b: model.Item) -> str:
 
 	return "No relation"
 
-def explain_loop(loop: List[model.Item]) -> str:
+def explain_loop(loop: List[model.Item], graph: RecipeGraph | None = None) -> str:
 	"""
 	Given a loop, explain how each sequential pair of items in the loop is related.
+	The relations are looked up in {graph} when given, see relation_of.
 	"""
 
-	# For each pair {item_a} and {item_b}, with b coming after a. Check if {item_a} and {
-	# item_b} are used to craft each other.
-	expl = "- "
-	round_loop = loop + [loop[0]]
-	for i in range(len(round_loop) - 1):
-		item_a = round_loop[i]
-		item_b = round_loop[i + 1]
-
-		relation_a = item_uses_ingredient(item_b, item_a)
-		arrow = ' -> '
-		if expl != "- ":
-			expl += click.style('\n- ', fg='blue')
-		expl += relation_a.ingredient.Name
-		expl += click.style(f'[{relation_a.MatchingIngredientRequirement}]',
-		                    fg='magenta')
-		expl += click.style(arrow, fg='blue')
-		expl += click.style(f'[{relation_a.MatchingIngredientType}]',
-		                    fg='magenta')
-		expl += relation_a.item.Name
+	expl = [explain_path(loop + [loop[0]], graph)]
 	# If any of the items in the loop has len(item.Effects) > 0, then add the effects to
 	# the explanation
 	if any(len(item.Effects) > 0 for item in loop):
-		expl += '\n\n  Items with effects: '
+		expl.append('\n\n  Items with effects: ')
 		for item in loop:
 			if len(item.Effects) == 0: continue
-			expl += '\n    '
-			expl += item.Name + ': ['
-			expl += click.style(', '.join(item.Effects), fg='yellow')
-			expl += ']'
+			expl.append(f"\n    {item.Name}: [{style(', '.join(item.Effects), fg='yellow')}]")
 
-	return f"{expl}\n"
+	expl.append("\n")
+	return "".join(expl)
 
-def explain_loop_simplified(loop: List[model.Item]) -> str:
+def explain_path(path: List[model.Item], graph: RecipeGraph | None = None) -> str:
+	"""
+	Given a path, where each item uses the previous one as ingredient, explain how each
+	sequential pair of items is related, one "- " line per pair.
+	"""
+
+	# For each pair {item_a} and {item_b}, with b coming after a, explain how {item_b}
+	# uses {item_a}.
+	steps = []
+	for i in range(len(path) - 1):
+		relation = relation_of(path[i + 1], path[i], graph)
+		steps.append(explain_edge(relation.ingredient.Name,
+		                          relation.MatchingIngredientRequirement,
+		                          relation.MatchingIngredientType, relation.item.Name))
+	return "- " + style('\n- ', fg='blue').join(steps)
+
+def explain_loop_simplified(loop: List[model.Item],
+                            graph: RecipeGraph | None = None) -> str:
 	"""
 	Given a loop, explain how each sequential pair of items in the loop is related.
 	"""
 
 	# For each pair {item_a} and {item_b}, with b coming after a. Check if {item_a} and {
 	# item_b} are used to craft each other.
-	explanation = ""
-	for i in range(len(loop)):
-		item = loop[i]
-		explanation += f"{item.Name}"
-		if i < len(loop) - 1:
-			explanation += click.style(' -> ', fg='blue')
-
-	return explanation
+	return style(' -> ', fg='blue').join(item.Name for item in loop)
 
 def describe_items(items: List[model.Item]) -> str:
 	"""
 	Given a list of items, describe each item.
 	"""
-	expl = ""
+	expl = []
 	for item in items:
-		expl += "  Name:\t\t" + click.style(item.Name, fg='blue') + "\n"
+		expl.append(f"  Name:\t\t{style(item.Name, fg='blue')}\n")
 
 		# Describe the item's types
 		if len(item.Type) > 0:
-			expl += f"  Types:\t{', '.join(item.Type)}\n"
+			expl.append(f"  Types:\t{', '.join(item.Type)}\n")
 
 		# Describe the item's recipe
 		if len(item.Recipe) > 0:
-			expl += f"  Recipe:\t{', '.join(item.Recipe)}\n"
+			expl.append(f"  Recipe:\t{', '.join(item.Recipe)}\n")
 
 		# Describe the item's effects
 		if len(item.Effects) > 0:
-			expl += '  Effects:\t'
-			expl += '['
-			expl += click.style(', '.join(item.Effects), fg='yellow')
-			expl += ']'
-			expl += '\n'
+			expl.append(f"  Effects:\t[{style(', '.join(item.Effects), fg='yellow')}]\n")
 
-		expl += '\n'
+		expl.append('\n')
 
-	return expl
+	return "".join(expl)
 
 def find_item_named(name: str, items: List[model.Item]) -> model.Item:
 	"""Given a list of items, find the item with the given name"""
@@ -165,17 +198,8 @@ def find_is_used_as_ingredient_of(item: model.Item, items: List[model.Item]) ->
 	For an item to be considered a match, it must have {item} in its Recipe list or any
 	of its types.
 	"""
-	matches = []
-	for i in items:
-		if item == i:
-			continue
-		if item.Name in i.Recipe:
-			matches.append(i)
-			continue
-		for t in item.Type:
-			if t in i.Recipe:
-				matches.append(i)
-	return matches
+	graph, ids = model.graph_holding(items)
+	return items_within(graph.consumers_of(item), graph, ids)
 
 def find_ingredients_of(item: model.Item, items: List[model.Item]) -> List[model.Item]:
 	"""
@@ -183,23 +207,24 @@ def find_ingredients_of(item: model.Item, items: List[model.Item]) -> List[model
 	For an item to be considered a match, it must have {item} in its Recipe list or any
 	of its types.
 	"""
-	matches = []
-	for i in items:
-		if i.Name in item.Recipe:
-			matches.append(i)
-			continue
-		for t in item.Recipe:
-			if t in i.Type:
-				matches.append(i)
-	return matches
+	graph, ids = model.graph_holding(items)
+	return items_within(graph.producers_of(item), graph, ids)
 
 def find_items_of_type(of_type: str, items: List[model.Item]) -> List[model.Item]:
 	"""Given a list of items, find all items of the given type."""
-	matches = []
-	for i in items:
-		if of_type.lower() in [t.lower() for t in i.Type]:
-			matches.append(i)
-	return matches
+	graph, ids = model.graph_holding(items)
+	return items_within(graph.items_of_category(of_type), graph, ids)
+
+def items_within(found: List[model.Item], graph: RecipeGraph,
+                 ids: Set[int] | None) -> List[model.Item]:
+	"""
+	The items of {found}, from {graph}, that are among {ids} (see model.graph_holding), or
+	all of them when None.
+	"""
+	if ids is None:
+		return found
+	kept = {id(graph.items[i]) for i in ids}
+	return [item for item in found if id(item) in kept]
 
 def find_bidireactional_related_items(item: model.Item, items: List[model.Item]) -> List[
 	model.Item]:
@@ -265,63 +290,49 @@ def compare_sequences(seq_a: List[model.Item], seq_b: List[model.Item]) -> bool:
 def find_looping_sequences(sequence: List[model.Item],
                            sequence_size: int,
                            possible_ending_items: List[model.Item],
-                           remaining_items: List[model.Item]) -> List[List[model.Item]]:
-	current_size = len(sequence)
-
-	if current_size == 0:
-		sequences = []
-		for starting_item in remaining_items:
-			next_remaining_items = [item for item in remaining_items if
-			                        item != starting_item]
-			# The starting_item uses the ending_item as ingredient
-			_possible_ending_items = find_ingredients_of(starting_item, next_remaining_items)
-			if len(_possible_ending_items) == 0:
-				continue
-			sequences.extend(find_looping_sequences([starting_item], sequence_size,
-			                                        _possible_ending_items,
-			                                        next_remaining_items))
-		return sequences
-
-	current_item = last(sequence)
-	possible_next_items = find_is_used_as_ingredient_of(current_item, remaining_items)
-
-	# the next item can be any possible_next_items
-	if current_size < sequence_size - 1:
-		sequences = []
-		for candidate in possible_next_items:
-			next_sequence = [*sequence, candidate]
-			next_remaining_items = [item for item in remaining_items if
-			                        item != candidate]
-			sequences.extend(
-				find_looping_sequences(next_sequence, sequence_size, possible_ending_items,
-				                       next_remaining_items))
-
-		return sequences
-
-	# the next item must be in the possible_ending_items
-	if current_size == sequence_size - 1:
-		sequences = []
-		for candidate in possible_next_items:
-			if candidate in possible_ending_items:
-				sequences.append([*sequence, candidate])
-		return sequences
-
-	return []
-
-def find_bidirectional_related_pairs(items: List[model.Item]) -> List[List[model.Item]]:
-	"""
-	Given a list of items, find all bidirectional pairs (loops).
-	"""
-	pairs: List[List[model.Item]] = []
-	for item in items:
-		bi_related_items = find_bidireactional_related_items(item, items)
-		pairs.extend([[item, related_item] for related_item in bi_related_items])
+                           remaining_items: List[model.Item],
+                           graph: RecipeGraph | None = None) -> List[List[model.Item]]:
+	"""
+	Find all sequences of {sequence_size} items extending {sequence} where each item uses
+	the previous one as ingredient and the last item is one of {possible_ending_items}.
+	With an empty {sequence}, every item of {remaining_items} is tried as the start.
+
+	{graph} must index every item of {sequence} and {remaining_items}; when not given,
+	it is built from them. The search itself runs on item ids, see model.loops.
+	"""
+	if graph is None:
+		graph = model.graph_of(remaining_items) if len(sequence) == 0 \
+			else model.RecipeGraph([*sequence, *remaining_items])
+
+	if len(sequence) == 0:
+		starting_ids = [graph.id_of(item) for item in remaining_items]
+		sequences = model.find_loop_ids(graph, sequence_size, starting_ids)
+	else:
+		sequences = model.find_sequence_ids(
+			graph, [graph.id_of(item) for item in sequence], sequence_size,
+			[graph.id_of(item) for item in possible_ending_items])
+	return [graph.items_of(s) for s in sequences]
+
+def find_bidirectional_related_pairs(items: List[model.Item]) -> List[
+	Tuple[UsesRelation, UsesRelation]]:
+	"""
+	Given a list of items, find all bidirectional pairs (loops of 2 items), each pair
+	once, as the relation of the second item using the first and of the first item using
+	the second, with the matching requirement on both sides.
+	"""
+	graph = model.graph_of(items)
+	pairs: List[Tuple[UsesRelation, UsesRelation]] = []
+	for a, b in model.iter_mutual_pairs(graph):
+		item_a, item_b = graph.items[a], graph.items[b]
+		pairs.append((item_uses_ingredient(item_b, item_a),
+		              item_uses_ingredient(item_a, item_b)))
 	return pairs
 
 @click.command(name="uses",
                help="Find all items that uses {--item-name} as ingredient")
 @click.option("--item-name", "-i", prompt_required=True, help="The item to search for")
 def cmd_find_recipe_matches(item_name: str) -> None:
+	all_items = get_all_items()
 	item = find_item_named(item_name, all_items)
 	matches = find_is_used_as_ingredient_of(item, all_items)
 	click.echo(f"Found {len(matches)} items that uses {item_name} as ingredient")
@@ -336,35 +347,33 @@ def cmd_find_recipe_matches(item_name: str) -> None:
 @click.argument("search_term", default="")
 def cmd_search_items(search_term: str, search_effect: str | None,
                      craftable: bool) -> None:
+	all_items = get_all_items()
+	with model.counters.phase("index"):
+		index = model.search_index_of(model.graph_of(all_items))
 	is_category = search_term.startswith("(")
 
-	if craftable:
-		search_scope = [item for item in all_items if len(item.Recipe) > 0]
-	else:
-		search_scope = all_items
+	search_scope: AbstractSet[int] = index.craftable if craftable else index.all_ids
 
 	if search_effect is not None and search_term == "":
-		matches = [item for item in search_scope if
-		           any([search_effect.lower() in effect.lower() for effect in
-		                item.Effects])]
+		matches = index.with_effect(search_effect) & search_scope
 		click.echo(f"Found {len(matches)} items of with effect {search_term}\n")
-		click.echo(describe_items(matches))
+		click.echo(describe_items(index.ids_to_items(matches)))
 	if search_effect is not None and search_term != "":
-		search_scope = [item for item in search_scope if
-		                any([search_effect.lower() in effect.lower() for effect in
-		                     item.Effects])]
+		search_scope = index.with_effect(search_effect) & search_scope
 	if is_category:
-		matches = find_items_of_type(search_term, search_scope)
+		matches = index.of_category(search_term) & search_scope
 		click.echo(f"Found {len(matches)} items of type {search_term}\n")
-		click.echo(describe_items(matches))
+		click.echo(describe_items(index.ids_to_items(matches)))
 	else:
-		if search_term == "":
-			matches = search_scope
-		else:
-			matches = [item for item in search_scope if
-			           search_term.lower() in item.Name.lower()]
+		matches = index.name_contains(search_term) & search_scope
 		click.echo(f"Found {len(matches)} items named {search_term}\n")
-		click.echo(describe_items(matches))
+		click.echo(describe_items(index.ids_to_items(matches)))
+		if not matches and search_term != "":
+			# Likely a typo, show the closest names instead
+			closest = index.fuzzy_names(search_term, within=search_scope)
+			if closest:
+				click.echo(f"Closest matches to {search_term}:\n")
+				click.echo(describe_items(index.ids_to_items(i for _, i in closest)))
 
 @click.command(name="loops",
                help="Find all loops of size {--size}")
@@ -373,70 +382,541 @@ def cmd_search_items(search_term: str, search_effect: str | None,
 @click.option("--simplified-output", "-S",
               help="Simplify the output by only the crafting order",
               is_flag=True, show_default=True, default=False)
+@click.option("--up-to", "-u",
+              help="Treat {--size} as the maximum size, finding loops of 2 to {--size} items",
+              is_flag=True, show_default=True, default=False)
 @click.option("--having-ingredients", "-i",
               help="Only show loops that have the given ingredients",
               multiple=True, default=[])
+@click.option("--limit", "-l", type=click.IntRange(min=0), default=None,
+              help="Stop the search after this many loops")
+@click.option("--count-only", "-n", is_flag=True, default=False,
+              help="Only count the loops, after printing a quick upper bound of the count")
+@click.option("--changes", "-c", is_flag=True, default=False,
+              help="Only print the loops which appeared or disappeared since the last "
+                   "run of the same query, as rows are included or excluded")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=1, show_default=True,
+              help="Number of worker processes to spread the starting items over")
+@click.option("--format", "-f", "output_format", type=click.Choice(["text", "jsonl", "csv"]),
+              default="text", show_default=True,
+              help="Explain each loop as text, or list its items as JSON Lines or csv rows")
+@click.option("--ids", is_flag=True, default=False,
+              help="List item ids instead of names in the jsonl and csv formats")
+@click.option("--unique/--rotations", default=True, show_default=True,
+              help="List each loop once, or once per rotation beginning at a starting "
+                   "item (at any item without a starting item)")
 @click.argument("starting-item-name", required=False, type=str, default=None)
 def cmd_find_all_loops_of_size(size: int, starting_item_name: str | None,
-                               simplified_output: bool,
-                               having_ingredients: Tuple[str]) -> None:
-	if starting_item_name is not None:
-		is_category = starting_item_name.startswith("(")
-		if not is_category:
-			starting_item = find_item_named(starting_item_name, all_items)
-			remaining_items = [item for item in all_items if item != starting_item]
-			possible_ending_items = find_ingredients_of(starting_item, remaining_items)
-			loops = find_looping_sequences([starting_item], size, possible_ending_items,
-			                               remaining_items)
-		else:
-			loops = []
-			matching_items = find_items_of_type(starting_item_name, all_items)
-			# Remove uncraftable items (no recipe)
-			matching_items = [item for item in matching_items if len(item.Recipe) > 0]
-			for item in matching_items:
-				remaining_items = [i for i in all_items if i != item]
-				possible_ending_items = find_ingredients_of(item, remaining_items)
-				loops.extend(
-					find_looping_sequences([item], size, possible_ending_items, remaining_items))
+                               simplified_output: bool, up_to: bool,
+                               having_ingredients: Tuple[str],
+                               limit: int | None, count_only: bool, changes: bool,
+                               jobs: int, output_format: str, ids: bool,
+                               unique: bool) -> None:
+	if changes:
+		if starting_item_name is not None:
+			raise click.UsageError("--changes only applies to the loops of the whole catalog")
+		print_loop_changes(size, min_size=2 if up_to else size,
+		                   having_ingredients=having_ingredients,
+		                   simplified_output=simplified_output,
+		                   output_format=output_format, ids=ids, unique=unique)
+		return
+
+	all_items = get_all_items()
+	with model.counters.phase("index"):
+		graph = model.graph_of(all_items)
+	min_size = 2 if up_to else size
+	starting_ids = starting_ids_of(starting_item_name, graph)
+
+	# Loops without all of {having_ingredients} are pruned during the search
+	required_ids = [graph.position.get(name, -1) for name in having_ingredients]
+	# loops through several starting items are searched and stored once
+	query = {"size": size, "min_size": min_size, "start": starting_item_name,
+	         "ingredients": sorted(set(having_ingredients)), "unique": True}
+	cached_loops = catalog.cached_loops(query) if catalog is not None else None
+	loops: Iterator[model.Loop]
+	if cached_loops is not None:
+		loops = iter(cached_loops)
+	elif -1 in required_ids:
+		loops = iter(())
+	elif jobs > 1 and size > 2:
+		loops = model.iter_cycle_ids_parallel(graph, jobs, size, min_size, required_ids,
+		                                      starting_ids, unique=True)
 	else:
-		loops = find_looping_sequences([], size, [], all_items)
+		# Loops of 2 items are the mutual edges, no search needed
+		loops = model.iter_loop_ids(graph, size, min_size, starting_ids, required_ids)
+	if cached_loops is None and catalog is not None:
+		loops = catalog.memoize_loops(query, loops)
+	if not unique:
+		loops = expand_rotations(loops, starting_ids)
+
+	if limit is not None:
+		loops = islice(loops, limit)
+
+	if count_only:
+		# Closed walks bound the loops without enumerating them, the exact count follows
+		with model.counters.phase("bound"):
+			walks = model.walk_matrix_of(graph)
+			# every rotation of a loop is a closed walk through one of its items
+			bound_ids = range(graph.size) if not unique and starting_ids is None \
+				else starting_ids
+			bound = walks.loop_upper_bound(size, min_size, bound_ids)
+		click.echo(f"At most {bound} loops of size {'up to ' if up_to else ''}{size}")
+		found = sum(1 for _ in model.counters.timed("search", loops))
+		click.echo(f"Found {found} loops of size {'up to ' if up_to else ''}{size}")
+		return
 
-	if len(having_ingredients) > 0:
-		def loop_has_ingredients(loop: List[model.Item]) -> bool:
-			for ingredient in having_ingredients:
-				if not any(item.Name == ingredient for item in loop):
-					return False
-			return True
+	# explain the loop by comparing each item to the next item with explain_relation
+	with model.counters.phase("output"), \
+		loop_writer(graph, simplified_output, output_format, ids) as writer:
+		for loop in model.counters.timed("search", loops):
+			writer.write(loop)
 
-		loops = [loop for loop in loops if loop_has_ingredients(loop)]
+	# Kept off stdout for the machine-readable formats
+	click.echo(f"Found {writer.count} loops of size {'up to ' if up_to else ''}{size}",
+	           err=output_format != "text")
 
-	click.echo(f"Found {len(loops)} loops of size {size}")
+def starting_ids_of(starting_item_name: str | None,
+                    graph: RecipeGraph) -> List[int] | None:
+	"""
+	The ids of the item named {starting_item_name}, or of the craftable items of a
+	"(Category)", or None for the whole catalog.
+	"""
+	if starting_item_name is None:
+		return None
+	is_category = starting_item_name.startswith("(")
+	if not is_category:
+		try:
+			starting_items = [find_item_named(starting_item_name, graph.items)]
+		except ValueError as e:
+			raise click.BadParameter(str(e), param_hint="STARTING_ITEM_NAME")
+	else:
+		starting_items = find_items_of_type(starting_item_name, graph.items)
+		# Remove uncraftable items (no recipe)
+		starting_items = [item for item in starting_items if len(item.Recipe) > 0]
+	return [graph.id_of(item) for item in starting_items]
 
-	# explain the loop by comparing each item to the next item with explain_relation
-	if simplified_output:
-		for loop in loops:
-			click.echo(f"{explain_loop_simplified(loop)}")
+def expand_rotations(loops: Iterable[model.Loop],
+                     starting_ids: List[int] | None) -> Iterator[model.Loop]:
+	"""
+	The rotations of each of the unique {loops} beginning at one of {starting_ids}, or at
+	any item when None.
+	"""
+	starting_set = None if starting_ids is None else set(starting_ids)
+	for loop in loops:
+		yield from model.rotations(loop, starting_set)
+
+def loop_writer(graph: RecipeGraph, simplified_output: bool, output_format: str,
+                ids: bool, tag_name: str = "change") -> LoopWriter:
+	"""A LoopWriter to stdout, explaining loops in the text format."""
+	explain = explain_loop_simplified if simplified_output else explain_loop
+	return model.LoopWriter(click.get_text_stream("stdout"), graph, output_format, ids,
+	                        explain, tag_name=tag_name)
+
+@click.command(name="best-loops",
+               help="Find the {--top} loops of size {--size} with the highest effect score")
+@click.option("--top", "-k", type=click.IntRange(min=1), default=10, show_default=True,
+              help="The number of loops to find")
+@click.option("--score", "-e", "score_terms", multiple=True, default=[],
+              metavar="EFFECT[=WEIGHT]",
+              help="Score the levels of the effects containing EFFECT by WEIGHT (1 by "
+                   "default), and no other effects. Every effect level scores 1 without it")
+@click.option("--size", "-s", help="The size of the loops to search for",
+              default=3, show_default=True)
+@click.option("--up-to", "-u", is_flag=True, default=False,
+              help="Treat {--size} as the maximum size, ranking loops of 2 to {--size} items")
+@click.option("--simplified-output", "-S", is_flag=True, default=False,
+              help="Simplify the output by only the crafting order")
+@click.option("--format", "-f", "output_format", type=click.Choice(["text", "jsonl", "csv"]),
+              default="text", show_default=True,
+              help="Explain each loop as text, or list its items as JSON Lines or csv rows, "
+                   "after its score")
+@click.option("--ids", is_flag=True, default=False,
+              help="List item ids instead of names in the jsonl and csv formats")
+@click.argument("starting-item-name", required=False, type=str, default=None)
+def cmd_best_loops(top: int, score_terms: Tuple[str], size: int, up_to: bool,
+                   simplified_output: bool, output_format: str, ids: bool,
+                   starting_item_name: str | None) -> None:
+	weights: Dict[str, float] | None = None
+	if score_terms:
+		weights = {}
+		for term in score_terms:
+			effect, _, weight = term.partition("=")
+			try:
+				weights[effect.strip().lower()] = float(weight) if weight else 1.0
+			except ValueError:
+				raise click.BadParameter(f"Invalid weight in {term}", param_hint="--score")
+
+	all_items = get_all_items()
+	with model.counters.phase("index"):
+		graph = model.graph_of(all_items)
+		scores = model.item_scores(graph.items, weights)
+	starting_ids = starting_ids_of(starting_item_name, graph)
+	with model.counters.phase("search"):
+		best = model.best_cycle_ids(graph, scores, top, size, 2 if up_to else size,
+		                            starting_ids)
+
+	with model.counters.phase("output"), \
+		loop_writer(graph, simplified_output, output_format, ids, "score") as writer:
+		for score, loop in best:
+			writer.write(loop, int(score) if score.is_integer() else score)
+	click.echo(f"Found the {len(best)} best loops of size {'up to ' if up_to else ''}{size}",
+	           err=output_format != "text")
+
+@click.command(name="path",
+               help="Find the shortest ways to craft TO_ITEM starting from FROM_ITEM")
+@click.option("--max-depth", "-d", type=int, default=6, show_default=True,
+              help="The maximum number of crafts between the two items")
+@click.option("--limit", "-l", type=click.IntRange(min=1), default=1, show_default=True,
+              help="The number of paths to find, shortest first")
+@click.option("--simplified-output", "-S", is_flag=True, default=False,
+              help="Simplify the output by only the crafting order")
+@click.argument("from-item", type=str)
+@click.argument("to-item", type=str)
+def cmd_path(from_item: str, to_item: str, max_depth: int, limit: int,
+             simplified_output: bool) -> None:
+	all_items = get_all_items()
+	with model.counters.phase("index"):
+		graph = model.graph_of(all_items)
+	ends = []
+	for name, hint in ((from_item, "FROM_ITEM"), (to_item, "TO_ITEM")):
+		if name not in graph.position:
+			raise click.BadParameter(f"Item not found: {name}", param_hint=hint)
+		ends.append(graph.position[name])
+	if ends[0] == ends[1]:
+		raise click.BadParameter("Use the loops command to find the ways back to the same "
+		                         "item", param_hint="TO_ITEM")
+
+	with model.counters.phase("search"):
+		paths = model.find_path_ids(graph, ends[0], ends[1], max_depth, limit)
+	for path in paths:
+		if simplified_output:
+			click.echo(explain_loop_simplified(graph.items_of(path), graph))
+		else:
+			click.echo(f"{len(path) - 1} crafts:\n"
+			           f"{explain_path(graph.items_of(path), graph)}\n")
+	if not paths:
+		click.echo(f"No way to craft {to_item} from {from_item} within {max_depth} crafts")
+	else:
+		click.echo(f"Found {len(paths)} path{'s' if len(paths) > 1 else ''} "
+		           f"from {from_item} to {to_item}")
+
+@click.command(name="components",
+               help="List the groups of items that can be crafted from each other")
+@click.option("--sizes-only", "-n", is_flag=True, default=False,
+              help="Only print the size of each group")
+def cmd_components(sizes_only: bool) -> None:
+	graph = model.graph_of(get_all_items())
+	members = model.components_of(graph).members()
+	groups = [ids for ids in members if len(ids) > 1]
+	for ids in groups:
+		if sizes_only:
+			click.echo(f"{len(ids)} items")
+		else:
+			names = ", ".join(item.Name for item in graph.items_of(ids))
+			click.echo(f"{style(f'{len(ids)} items:', fg='blue')} {names}\n")
+	click.echo(f"Found {len(groups)} group{'s' if len(groups) != 1 else ''} of items on "
+	           f"loops, {len(members) - len(groups)} items are on no loop")
+
+@click.command(name="ingest",
+               help="Stream large csv files into a recipe graph, reporting the throughput")
+@click.option("--format", "-f", "csv_format", type=click.Choice(["ryza", "ryza_2", "datamined"]),
+              default="ryza", show_default=True,
+              help="The layout of the csv files: the bundled csvs, or a data-mined item dump "
+                   "with ingredient_set/N/ing columns")
+@click.option("--chunk-size", type=click.IntRange(min=1), default=4096, show_default=True,
+              help="Rows parsed and indexed at a time")
+@click.argument("files", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+def cmd_ingest(files: Tuple[str], csv_format: str, chunk_size: int) -> None:
+	try:
+		graph, stats = model.ingest_csv_files(files, model.ROW_PARSERS[csv_format],
+		                                      chunk_size)
+	except KeyError as e:
+		raise click.BadParameter(f"The csv has no {e} column", param_hint="--format")
+	click.echo(f"Indexed {stats.items} items from {stats.rows} rows in {stats.chunks} chunks, "
+	           f"{len(graph.succ_set)} uses between them")
+	click.echo(f"{stats.seconds:.3f}s, {stats.rows_per_second:,.0f} rows/s")
+	if stats.peak_memory is not None:
+		click.echo(f"Peak memory: {stats.peak_memory / 2**20:.1f} MB")
+
+@click.command(name="reach",
+               help="Find the items reachable from an item within {--steps} uses")
+@click.option("--steps", "-k", type=int, default=2, show_default=True,
+              help="The maximum number of uses between the item and the items found")
+@click.option("--reverse", "-r", is_flag=True, default=False,
+              help="Follow the ingredients instead, finding what the item can be made from")
+@click.argument("item-name", type=str)
+def cmd_reach(item_name: str, steps: int, reverse: bool) -> None:
+	all_items = get_all_items()
+	graph = model.graph_of(all_items)
+	if item_name.startswith("("):
+		start_ids = [graph.id_of(item) for item in find_items_of_type(item_name, all_items)]
+	elif item_name in graph.position:
+		start_ids = [graph.position[item_name]]
 	else:
-		for loop in loops:
-			click.echo(f"{explain_loop(loop)}")
+		raise click.BadParameter(f"Item not found: {item_name}", param_hint="ITEM_NAME")
+
+	levels = model.walk_matrix_of(graph).reach_levels(start_ids, steps, reverse)
+	found = 0
+	for step, level in enumerate(levels[1:], start=1):
+		names = [item.Name for item in graph.items_of(model.bits(level))]
+		click.echo(f"{step} step{'s' if step > 1 else ''}:\t{', '.join(names)}")
+		found += len(names)
+	direction = "that can be made into" if reverse else "reachable from"
+	click.echo(f"Found {found} items {direction} {item_name} within {steps} steps")
+
+def print_loop_changes(size: int, min_size: int, having_ingredients: Tuple[str],
+                       simplified_output: bool, output_format: str = "text",
+                       ids: bool = False, unique: bool = True) -> None:
+	"""
+	Print the loops gained (+) and lost (-) since the last run of the same query, as
+	rows of the csv were included or excluded, each rotation of them unless {unique}.
+	The first run only records the loops.
+	"""
+	incremental = get_incremental_catalog()
+	graph = incremental.graph
+	assert graph is not None
+	required_ids = [graph.position.get(name, -1) for name in having_ingredients]
+	if -1 in required_ids:
+		raise click.BadParameter(f"Unknown ingredient in {having_ingredients}",
+		                         param_hint="--having-ingredients")
+	result = incremental.loop_changes(size, min_size, required_ids)
+	if use_cache:
+		get_cache().store_incremental(incremental)
+
+	with loop_writer(graph, simplified_output, output_format, ids) as writer:
+		for sign, loops in (("+", result.new), ("-", result.gone)):
+			for loop in loops if unique else expand_rotations(loops, None):
+				writer.write(loop, sign)
+	if result.baseline:
+		click.echo(f"Recorded {len(result.loops)} loops, run again to see what changed",
+		           err=output_format != "text")
+	else:
+		click.echo(f"{len(result.new)} new and {len(result.gone)} gone loops, "
+		           f"{len(result.loops)} in total", err=output_format != "text")
 
-materials: Model
-recipes: Model
-all_items: list[Item]
+@dataclass
+class LoadedCatalog:
+	"""The catalog of a game as loaded in this process."""
+	items: List[model.Item]
+	catalog: CachedCatalog | None
+	# mtimes of the game's files when they were loaded, to reload them when they change
+	mtimes: Tuple[int, ...]
+
+# The game searched by the commands, set by the cli --game option
+game_name = "ryza_2"
+# game name -> its catalog, so that a session can switch games without reloading them
+loaded_catalogs: Dict[str, LoadedCatalog] = {}
+# The cached catalog of the current game, when caching
+catalog: CachedCatalog | None = None
+cache: CatalogCache | None = None
+incremental_catalogs: Dict[str, IncrementalCatalog] = {}
+# Set by the cli group options, used when the catalog is first needed
+use_cache = True
+validate_catalog = False
+catalog_cache_dir: str | None = None
+catalog_cache_size = 256
+
+def current_game() -> Game:
+	if game_name not in model.GAMES:
+		raise click.BadParameter(f"Unknown game {game_name!r}, expected one of "
+		                         f"{', '.join(model.GAMES)}", param_hint="--game")
+	return model.GAMES[game_name]
+
+def get_all_items() -> List[Item]:
+	"""
+	The items of the current game's catalog, loaded on first use so that commands which
+	don't need the catalog (e.g. --help) start fast, and loaded again if any of its csv
+	files changed since.
+	"""
+	global catalog
+	game = current_game()
+	mtimes = tuple(os.stat(file).st_mtime_ns for file in game.files)
+	loaded = loaded_catalogs.get(game.name)
+	if loaded is None or loaded.mtimes != mtimes:
+		cached = None
+		with model.counters.phase("load catalog"):
+			if not use_cache:
+				recipes = game.load()
+			else:
+				cached = get_cache().load_catalogs(game.files, game.strategy)
+				recipes = cached.model
+		if validate_catalog:
+			try:
+				with model.counters.phase("validate"):
+					model.validate_model(recipes)
+			except ValueError as e:
+				raise click.ClickException(f"Invalid catalog: {e}")
+		loaded = loaded_catalogs[game.name] = LoadedCatalog(recipes.items, cached, mtimes)
+	catalog = loaded.catalog
+	return loaded.items
+
+def get_cache() -> CatalogCache:
+	global cache
+	if cache is None:
+		cache = model.CatalogCache(catalog_cache_dir or model.default_cache_dir(),
+		                           catalog_cache_size * 1024 * 1024)
+	return cache
+
+def get_incremental_catalog() -> IncrementalCatalog:
+	"""
+	The IncrementalCatalog of the current game, kept for the whole session (and in the
+	cache between runs), refreshed with the current Include column.
+	"""
+	game = current_game()
+	incremental = incremental_catalogs.get(game.name)
+	if incremental is None:
+		if use_cache:
+			incremental = get_cache().load_incremental(game.files, game.strategy)
+		else:
+			incremental = model.IncrementalCatalog(game.files, game.strategy)
+		incremental_catalogs[game.name] = incremental
+	incremental.refresh()
+	return incremental
 
 @click.group()
-def cli() -> None:
-	global materials, recipes, all_items
+@click.option("--no-cache", is_flag=True, default=False,
+              help="Always parse the csv and search loops from scratch")
+@click.option("--cache-dir", type=click.Path(file_okay=False), default=None,
+              help="Where parsed catalogs and loop results are cached "
+                   "[default: $LOOPFINDER_CACHE_DIR or ~/.cache/loopfinder]")
+@click.option("--cache-size", type=int, default=256, show_default=True,
+              help="Maximum cache size in MB, least recently used entries are evicted")
+@click.option("--validate", is_flag=True, default=False,
+              help="Validate every loaded item against the pydantic item schema")
+@click.option("--game", "-g", default="ryza_2", show_default=True,
+              help="The game whose catalog is searched, see the games command")
+@click.option("--profile", is_flag=True, default=False,
+              help="Print the time of each phase, search counters and peak memory to stderr")
+@click.option("--profile-output", type=click.Path(dir_okay=False), default=None,
+              help="Also profile the run with cProfile, writing pstats to this file")
+@click.pass_context
+def cli(ctx: click.Context, no_cache: bool, cache_dir: str | None, cache_size: int,
+        validate: bool, game: str, profile: bool, profile_output: str | None) -> None:
+	global use_cache, catalog_cache_dir, catalog_cache_size, validate_catalog, game_name
+	global catalog, cache
+	use_cache, catalog_cache_dir, catalog_cache_size = not no_cache, cache_dir, cache_size
+	validate_catalog = validate
+	game_name = game
+	current_game()
+	# (Re)loaded on first use with these settings
+	loaded_catalogs.clear()
+	incremental_catalogs.clear()
+	catalog, cache = None, None
+	# Styled only on a terminal, as click.echo would keep the styles, unless the
+	# context's color setting says otherwise
+	set_color_output(ctx.color if ctx.color is not None
+	                 else click.get_text_stream("stdout").isatty())
+	if profile or profile_output is not None:
+		start_profiling(ctx, profile_output)
+
+def start_profiling(ctx: click.Context, profile_output: str | None) -> None:
+	"""
+	Record the model counters (and cProfile stats into {profile_output}) until the
+	command ends, then print them to stderr.
+	"""
+	counters = model.counters
+	counters.reset()
+	counters.enabled = True
+	profiler = None
+	if profile_output is not None:
+		import cProfile
+		profiler = cProfile.Profile()
+		profiler.enable()
+	start = time.perf_counter()
+
+	def report() -> None:
+		if profiler is not None and profile_output is not None:
+			profiler.disable()
+			profiler.dump_stats(profile_output)
+		counters.enabled = False
+		click.echo(f"Total: {(time.perf_counter() - start) * 1000:.1f} ms", err=True)
+		click.echo(counters.report(), err=True)
+		if profile_output is not None:
+			click.echo(f"cProfile stats written to {profile_output}", err=True)
+
+	ctx.call_on_close(report)
+
+@click.command(name="shell",
+               help="Read commands from stdin, one per line, keeping the catalog loaded")
+@click.option("--timing", "-t", is_flag=True, default=False,
+              help="Print how long each command took")
+def cmd_shell(timing: bool) -> None:
+	"""
+	Answer the other commands (e.g. `loops -s 3 Flour`) without reloading the catalog,
+	its index or the loop results already computed in this session. The catalog is only
+	loaded again when the csv is modified.
+	"""
+	get_all_items()
+	interactive = sys.stdin.isatty()
+	if interactive:
+		click.echo("Commands: " + ", ".join(name for name in cli.commands if name != "shell")
+		           + ". Type game NAME to switch games, exit or Ctrl-D to quit.")
+	while True:
+		try:
+			line = input("loopfinder> " if interactive else "")
+		except EOFError:
+			break
+		try:
+			args = shlex.split(line)
+		except ValueError as e:
+			click.echo(f"Error: {e}", err=True)
+			continue
+		if len(args) == 0:
+			continue
+		if args[0] in ("exit", "quit"):
+			break
+		if args[0] == "game" and len(args) <= 2:
+			switch_game(args[1] if len(args) == 2 else None)
+			continue
+		command = cli.commands.get(args[0])
+		if command is None or command is cmd_shell:
+			click.echo(f"Error: No such command '{args[0]}'.", err=True)
+			continue
 
-	#materials = model.load_csv_data("assets/ryza_materials.csv", model.ryza_csv_load_strategy)
-	#recipes = model.load_csv_data("assets/ryza_recipes.csv", model.ryza_csv_load_strategy)
-	#all_items = materials.items + recipes.items
-	recipes = model.load_csv_data("assets/ryza_2_recipes.csv", model.ryza_csv_load_strategy)
-	all_items = recipes.items
+		start = time.perf_counter()
+		try:
+			command.main(args[1:], prog_name=args[0], standalone_mode=False)
+		except click.ClickException as e:
+			e.show()
+		except click.Abort:
+			click.echo("Aborted!", err=True)
+		except ValueError as e:
+			click.echo(f"Error: {e}", err=True)
+		if timing:
+			click.echo(f"({(time.perf_counter() - start) * 1000:.1f} ms)", err=True)
+
+def switch_game(name: str | None) -> None:
+	"""
+	Switch the shell to game {name}, keeping the catalogs already loaded, or print the
+	current game when no {name} is given.
+	"""
+	global game_name
+	if name is not None:
+		if name not in model.GAMES:
+			click.echo(f"Error: Unknown game {name!r}, expected one of "
+			           f"{', '.join(model.GAMES)}", err=True)
+			return
+		game_name = name
+		get_all_items()
+	click.echo(f"Game: {current_game().title} ({game_name})")
+
+@click.command(name="games", help="List the games whose catalogs can be searched")
+def cmd_games() -> None:
+	for game in model.GAMES.values():
+		current = "*" if game.name == game_name else " "
+		click.echo(f"{current} {game.name:<10} {game.title:<20} "
+		           f"{', '.join(os.path.basename(file) for file in game.files)}")
 
 cli.add_command(cmd_find_recipe_matches)
 cli.add_command(cmd_search_items)
 cli.add_command(cmd_find_all_loops_of_size)
+cli.add_command(cmd_best_loops)
+cli.add_command(cmd_path)
+cli.add_command(cmd_components)
+cli.add_command(cmd_ingest)
+cli.add_command(cmd_reach)
+cli.add_command(cmd_games)
+cli.add_command(cmd_shell)
 
 if __name__ == "__main__":
 	cli()
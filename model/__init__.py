@@ -1 +1,70 @@
-from model.items import *
+"""
+The public names of the model submodules, imported on first access so that importing
+the package (e.g. for `main.py --help`) does not pay for pydantic or the search engines.
+"""
+from __future__ import annotations
+
+import importlib
+from typing import TYPE_CHECKING, Any, Dict
+
+if TYPE_CHECKING:
+	from model.items import *
+	from model.graph import *
+	from model.loops import *
+	from model.cycles import *
+	from model.parallel import *
+	from model.cache import *
+	from model.validation import *
+	from model.incremental import *
+	from model.search import *
+	from model.walks import *
+	from model.output import *
+	from model.profiling import *
+	from model.games import *
+	from model.best import *
+	from model.paths import *
+	from model.components import *
+	from model.ingest import *
+	from model.service import *
+
+# public name -> submodule defining it
+_exports: Dict[str, str] = {
+	**dict.fromkeys(["Item", "Model", "RowParser", "ryza_csv_load_strategy",
+	                 "ryza_csv_row_parser", "ryza_2_csv_load_strategy",
+	                 "ryza_2_csv_row_parser", "datamined_csv_row_parser", "load_csv_data",
+	                 "merge_models", "load_csv_files"], "items"),
+	**dict.fromkeys(["uses_label", "Adjacency", "RecipeGraph", "graph_of",
+	                 "graph_holding"], "graph"),
+	**dict.fromkeys(["Loop", "canonical_rotation", "rotations", "find_sequence_ids",
+	                 "find_loop_ids"], "loops"),
+	**dict.fromkeys(["distances_to", "iter_cycle_ids", "iter_cycle_ids_through",
+	                 "find_cycle_ids", "find_cycle_ids_through", "iter_mutual_pairs",
+	                 "iter_loop_ids"],
+	                "cycles"),
+	**dict.fromkeys(["iter_cycle_ids_parallel"], "parallel"),
+	**dict.fromkeys(["default_cache_dir", "CatalogCache", "CachedCatalog"], "cache"),
+	**dict.fromkeys(["ValidatedItem", "validate_model"], "validation"),
+	**dict.fromkeys(["load_all_rows", "LoopChanges", "IncrementalCatalog"], "incremental"),
+	**dict.fromkeys(["SearchIndex", "search_index_of"], "search"),
+	**dict.fromkeys(["bits", "WalkMatrix", "walk_matrix_of"], "walks"),
+	**dict.fromkeys(["FORMATS", "LoopWriter"], "output"),
+	**dict.fromkeys(["Counters", "counters", "peak_memory_bytes"], "profiling"),
+	**dict.fromkeys(["Game", "GAMES", "DEFAULT_GAME", "register_game"], "games"),
+	**dict.fromkeys(["effect_level", "item_scores", "best_cycle_ids"], "best"),
+	**dict.fromkeys(["shortest_path_ids", "iter_path_ids", "find_path_ids"], "paths"),
+	**dict.fromkeys(["component_ids", "Components", "components_of"], "components"),
+	**dict.fromkeys(["ROW_PARSERS", "IngestStats", "iter_item_chunks", "ingest_csv_files"],
+	                "ingest"),
+	**dict.fromkeys(["UsesQuery", "SearchQuery", "LoopsQuery", "Query", "LoopFinder",
+	                 "answer_uses", "answer_search", "answer_loops"], "service"),
+}
+
+def __getattr__(name: str) -> Any:
+	if name not in _exports:
+		raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+	value = getattr(importlib.import_module(f"model.{_exports[name]}"), name)
+	globals()[name] = value
+	return value
+
+def __dir__() -> list[str]:
+	return sorted([*globals(), *_exports])
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import heapq
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from model.components import components_of
+from model.cycles import distances_to
+from model.profiling import counters
+
+if TYPE_CHECKING:
+	from model.graph import Adjacency
+	from model.items import Item
+	from model.loops import Loop
+
+def effect_level(effect: str) -> Tuple[str, int]:
+	"""The name and level of {effect}: ("Synth Quantity", 2) for "Synth Quantity +2"."""
+	name, plus, level = effect.rpartition(" +")
+	if plus and level.isdigit():
+		return name, int(level)
+	return effect, 1
+
+def item_scores(items: Iterable[Item], weights: Dict[str, float] | None = None) \
+	-> List[float]:
+	"""
+	The score of each of {items}: the level of each of its effects times the weight of
+	the effect, the sum of the {weights} whose key is contained in the lowercase effect
+	name. Every effect weighs 1 when {weights} is None, and 0 when no key matches.
+	"""
+	scores = []
+	for item in items:
+		score = 0.0
+		for effect in item.Effects:
+			name, level = effect_level(effect)
+			if weights is None:
+				score += level
+			else:
+				name = name.lower()
+				score += level * sum(w for key, w in weights.items() if key in name)
+		scores.append(score)
+	return scores
+
+# (score, -order found, loop) of the best loops found, worst first
+_Heap = List[Tuple[float, int, "Loop"]]
+
+def _best_rest(scores: Sequence[float], by_score: Sequence[int], distance: List[int],
+               start: int, max_size: int) -> List[float]:
+	"""
+	best_rest[n]: the most the scores of n more items on a loop through {start} can add,
+	from the best scoring items within its reach.
+	"""
+	best_rest = [0.0]
+	total = 0.0
+	for i in by_score:
+		if len(best_rest) == max_size:
+			break
+		if distance[i] < max_size and i != start:
+			total += scores[i]
+			best_rest.append(max(best_rest[-1], total))
+	best_rest += [best_rest[-1]] * (max_size - len(best_rest))
+	return best_rest
+
+def _best_cycles_through(consumers: List[List[int]], scores: Sequence[float], start: int,
+                         min_size: int, max_size: int, distance: List[int],
+                         best_rest: List[float], excluded: bytearray, heap: _Heap,
+                         top: int, keep: Callable[[float, Loop], None]) -> Tuple[int, int]:
+	"""
+	Walk the loops through {start} into {keep}, best scoring consumers first, abandoning
+	the paths that can't beat the worst of the {top} loops in {heap}. The numbers of
+	items expanded and of paths bounded.
+	"""
+	expanded = bounded = 0
+	visited = bytearray(excluded)
+	visited[start] = 1
+	path = [start]
+	path_scores = [scores[start]]
+	stack = [iter(consumers[start])]
+	while stack:
+		size = len(path)
+		score = path_scores[-1]
+		for candidate in stack[-1]:
+			if visited[candidate] or size + distance[candidate] > max_size:
+				continue
+			if len(heap) == top and \
+				score + scores[candidate] + best_rest[max_size - size - 1] <= heap[0][0]:
+				# the remaining candidates score no higher
+				bounded += 1
+				stack[-1] = iter(())
+				break
+			if size + 1 == max_size:
+				# {candidate} uses {start} (distance 1)
+				keep(score + scores[candidate], (*path, candidate))
+				continue
+			visited[candidate] = 1
+			path.append(candidate)
+			path_scores.append(score + scores[candidate])
+			stack.append(iter(consumers[candidate]))
+			expanded += 1
+			if size + 1 >= min_size and distance[candidate] == 1:
+				keep(path_scores[-1], tuple(path))
+			break
+		else:
+			stack.pop()
+			path_scores.pop()
+			visited[path.pop()] = 0
+	return expanded, bounded
+
+def best_cycle_ids(graph: Adjacency, scores: Sequence[float], top: int, max_size: int,
+                   min_size: int | None = None,
+                   starting_ids: Iterable[int] | None = None) -> List[Tuple[float, Loop]]:
+	"""
+	The {top} loops of {min_size} to {max_size} items (exactly {max_size} when {min_size}
+	is not given) with the highest sum of the {scores} of their items, best first, with
+	their score. Loops of the whole catalog begin at their smallest id; with
+	{starting_ids}, only the loops through them are ranked, once each, beginning at the
+	first of them (as iter_cycle_ids_through(..., unique=True) finds them).
+	Ties are kept in the order the search finds them.
+
+	Branch and bound: the search walks each item's consumers best scoring first and
+	keeps the best loops in a heap of {top}. A path whose score, plus the best scores its
+	remaining items could add, can't beat the worst loop kept is abandoned along with
+	the rest of its (lower scoring) candidates, so most loops are never built.
+	"""
+	min_size = max_size if min_size is None else min_size
+	if top < 1 or max_size < 2 or min_size > max_size:
+		return []
+	min_size = max(min_size, 2)
+	offsets, succ_set = graph.succ_set_offsets, graph.succ_set
+	by_score = sorted(range(graph.size), key=lambda i: -scores[i])
+	# the most any max_size - 1 items can add, to skip hopeless starting items before
+	# searching the items within their reach
+	best_any = max(0.0, sum(scores[i] for i in by_score[:max_size - 1]))
+	# the consumers of each item, best scoring first
+	consumers = [sorted(succ_set[offsets[i]:offsets[i + 1]], key=lambda j: -scores[j])
+	             for i in range(graph.size)]
+	heap: _Heap = []
+	found = 0
+
+	def keep(score: float, loop: Loop) -> None:
+		nonlocal found
+		found += 1
+		if len(heap) < top:
+			heapq.heappush(heap, (score, -found, loop))
+		elif score > heap[0][0]:
+			heapq.heapreplace(heap, (score, -found, loop))
+
+	unique = starting_ids is not None
+	components = components_of(graph)
+	# with {starting_ids}, the starting items already searched
+	searched: List[int] = []
+	expanded = bounded = 0
+	for start in range(graph.size) if starting_ids is None else starting_ids:
+		if not components.on_loops(start) or start in searched:
+			continue
+		if unique:
+			searched.append(start)
+		if len(heap) == top and scores[start] + best_any <= heap[0][0]:
+			bounded += 1
+			continue
+		# only the component of {start} is searched, as in iter_cycle_ids
+		excluded = components.excluded(start)
+		earlier = [i for i in searched[:-1] if not excluded[i]]
+		if earlier:
+			excluded = bytearray(excluded)
+			for i in earlier:
+				excluded[i] = 1
+		lowest_id = 0 if unique else start
+		distance = distances_to(graph, start, max_size - 1, lowest_id, excluded)
+		best_rest = _best_rest(scores, by_score, distance, start, max_size)
+		if len(heap) == top and scores[start] + best_rest[max_size - 1] <= heap[0][0]:
+			bounded += 1
+			continue
+		start_expanded, start_bounded = _best_cycles_through(
+			consumers, scores, start, min_size, max_size, distance, best_rest, excluded,
+			heap, top, keep)
+		expanded += start_expanded
+		bounded += start_bounded
+
+	if counters.enabled:
+		counters.add("dfs.visited", expanded)
+		counters.add("best.bounded", bounded)
+	return [(score, loop) for score, _, loop in sorted(heap, key=lambda x: (-x[0], -x[1]))]
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import pickle
+import sys
+from pathlib import Path
+from typing import (TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Sequence,
+                    TextIO)
+
+from model.incremental import IncrementalCatalog
+from model.items import merge_models
+from model.profiling import counters
+
+if TYPE_CHECKING:
+	from model.items import Model
+	from model.loops import Loop
+
+# Bumped whenever the pickled catalog or result format changes
+CACHE_FORMAT = 3
+
+def default_cache_dir() -> Path:
+	"""$LOOPFINDER_CACHE_DIR, or loopfinder/ under $XDG_CACHE_HOME (~/.cache)."""
+	if "LOOPFINDER_CACHE_DIR" in os.environ:
+		return Path(os.environ["LOOPFINDER_CACHE_DIR"])
+	cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+	return Path(cache_home) / "loopfinder"
+
+class CatalogCache:
+	"""
+	On-disk cache of parsed catalogs and of loop search results.
+
+	Entries live under a directory per catalog, keyed by the sha256 of the csv content
+	plus the load strategy, so editing the csv (e.g. toggling the Include column) or
+	switching strategy never serves stale data. Entries are pickled; reading an entry
+	refreshes its mtime, and once the cache grows past {max_bytes} the least recently
+	used entries are evicted.
+
+	Loop results are only stored up to {max_loops} loops per query: bigger results
+	are streamed without being kept, so their memory stays flat, and are searched again.
+
+	The cache is best-effort: when its directory can't be written, entries are simply
+	not stored (with one warning on stderr) and everything is parsed and searched anew.
+	"""
+
+	def __init__(self, directory: Path | str, max_bytes: int = 256 * 1024 * 1024,
+	             max_loops: int = 100_000) -> None:
+		self.directory = Path(directory)
+		self.max_bytes = max_bytes
+		self.max_loops = max_loops
+		self._warned = False
+
+	@staticmethod
+	def catalog_key(data: bytes, strategy: Callable[[TextIO], Model]) -> str:
+		digest = hashlib.sha256(data)
+		digest.update(f"{strategy.__module__}.{strategy.__qualname__}".encode())
+		digest.update(f"format {CACHE_FORMAT}".encode())
+		return digest.hexdigest()[:32]
+
+	def load_catalog(self, file: str, strategy: Callable[[TextIO], Model]) -> CachedCatalog:
+		"""
+		Load {file} with {strategy}, from the cache when the same content was already
+		parsed with the same strategy.
+		"""
+		return self.load_catalogs([file], strategy)
+
+	def load_catalogs(self, files: Sequence[str],
+	                  strategy: Callable[[TextIO], Model]) -> CachedCatalog:
+		"""
+		Load each of {files} with {strategy} into one catalog (e.g. all the files of a
+		game), cached as a whole. On a miss, several files are parsed concurrently.
+		"""
+		contents = []
+		for file in files:
+			with open(file, "rb") as csvfile:
+				contents.append(csvfile.read())
+		# Length-prefixed so that moving rows between files changes the key
+		data = b"".join(contents) if len(contents) == 1 \
+			else b"".join(b"%d:%b" % (len(content), content) for content in contents)
+		catalog = CachedCatalog(self, self.catalog_key(data, strategy))
+		model = self.read_entry(catalog.path / "catalog.pickle")
+		counters.add("cache.catalog.misses" if model is None else "cache.catalog.hits")
+		if model is None:
+			model = self._parse(contents, strategy)
+			self.write_entry(catalog.path / "catalog.pickle", model)
+		catalog.model = model
+		return catalog
+
+	@staticmethod
+	def _parse(contents: List[bytes], strategy: Callable[[TextIO], Model]) -> Model:
+		def parse(content: bytes) -> Model:
+			return strategy(io.StringIO(content.decode(), newline=''))
+
+		if len(contents) == 1:
+			return parse(contents[0])
+		from concurrent.futures import ThreadPoolExecutor
+		with ThreadPoolExecutor(max_workers=len(contents)) as executor:
+			return merge_models(executor.map(parse, contents))
+
+	def load_incremental(self, files: Sequence[str],
+	                     strategy: Callable[[TextIO], Model]) -> IncrementalCatalog:
+		"""
+		The IncrementalCatalog of {files} with {strategy} as last stored, or a new one.
+		"""
+		incremental = self.read_entry(self._incremental_path(files, strategy))
+		if incremental is None:
+			incremental = IncrementalCatalog(files, strategy)
+		return incremental
+
+	def store_incremental(self, incremental: IncrementalCatalog) -> None:
+		self.write_entry(self._incremental_path(incremental.files, incremental.strategy),
+		                 incremental)
+
+	def _incremental_path(self, files: Sequence[str],
+	                      strategy: Callable[[TextIO], Model]) -> Path:
+		digest = hashlib.sha256("\n".join(str(Path(file).resolve())
+		                                   for file in files).encode())
+		digest.update(f"{strategy.__module__}.{strategy.__qualname__}".encode())
+		digest.update(f"format {CACHE_FORMAT}".encode())
+		return self.directory / "incremental" / f"{digest.hexdigest()[:32]}.pickle"
+
+	def read_entry(self, path: Path) -> Any:
+		try:
+			with open(path, "rb") as file:
+				value = pickle.load(file)
+			# evicted by another process in between, the value read is still good
+			with contextlib.suppress(OSError):
+				os.utime(path)
+		except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+			return None
+		return value
+
+	def write_entry(self, path: Path, value: Any) -> bool:
+		"""Store {value} at {path}, and whether it could be stored."""
+		tmp = path.with_suffix(f".{os.getpid()}.tmp")
+		try:
+			path.parent.mkdir(parents=True, exist_ok=True)
+			with open(tmp, "wb") as file:
+				pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+			os.replace(tmp, path)
+		except OSError as e:
+			with contextlib.suppress(OSError):
+				tmp.unlink(missing_ok=True)
+			self._warn(e)
+			return False
+		self.evict()
+		return True
+
+	def _warn(self, error: OSError) -> None:
+		if not self._warned:
+			self._warned = True
+			print(f"Warning: not caching in {self.directory}: {error}", file=sys.stderr)
+
+	def evict(self) -> None:
+		"""Remove the least recently used entries until the cache fits {max_bytes}."""
+		entries = []
+		for path in self.directory.rglob("*.pickle"):
+			try:
+				stat = path.stat()
+			except OSError:
+				continue
+			entries.append((stat.st_mtime, stat.st_size, path))
+		total = sum(size for _, size, _ in entries)
+		for _, size, path in sorted(entries):
+			if total <= self.max_bytes:
+				break
+			try:
+				path.unlink(missing_ok=True)
+			except OSError as e:
+				self._warn(e)
+				break
+			total -= size
+
+class CachedCatalog:
+	"""
+	A catalog loaded through a CatalogCache, with its memoized loop queries, kept in
+	memory as well for long-lived sessions.
+	"""
+	model: Model
+
+	def __init__(self, cache: CatalogCache, key: str) -> None:
+		self.cache = cache
+		self.key = key
+		self.path = cache.directory / key
+		self._loops: Dict[Path, List[Loop]] = {}
+
+	def _loops_path(self, query: Dict[str, Any]) -> Path:
+		key = hashlib.sha256(json.dumps(query, sort_keys=True).encode()).hexdigest()[:32]
+		return self.path / "loops" / f"{key}.pickle"
+
+	def cached_loops(self, query: Dict[str, Any]) -> List[Loop] | None:
+		"""The stored results of {query}, if it was run to completion before."""
+		path = self._loops_path(query)
+		if path not in self._loops:
+			loops = self.cache.read_entry(path)
+			if loops is None:
+				counters.add("cache.loops.misses")
+				return None
+			self._loops[path] = loops
+		counters.add("cache.loops.hits")
+		return self._loops[path]
+
+	def memoize_loops(self, query: Dict[str, Any], loops: Iterable[Loop]) -> Iterator[Loop]:
+		"""
+		Yield {loops}, storing them as the results of {query} once fully consumed.
+		Searches stopped early (e.g. by --limit) are not stored, nor are results of more
+		than the cache's max_loops loops, which stop being kept once past it.
+		"""
+		found: List[Loop] | None = []
+		for loop in loops:
+			if found is not None:
+				found.append(loop)
+				if len(found) > self.cache.max_loops:
+					found = None
+			yield loop
+		if found is None:
+			return
+		path = self._loops_path(query)
+		self._loops[path] = found
+		self.cache.write_entry(path, found)
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Dict, List
+
+from model.graph import RECENT_GRAPHS
+
+if TYPE_CHECKING:
+	from model.graph import Adjacency
+
+def component_ids(graph: Adjacency) -> List[int]:
+	"""
+	The strongly connected component of each item of {graph}, numbered from 0 in the
+	order Tarjan's algorithm completes them (consumers before their ingredients), and
+	-1 for the disabled items. Two items are in the same component when each can be
+	crafted, through any number of crafts, from the other.
+	"""
+	succ_set_offsets, succ_set = graph.succ_set_offsets, graph.succ_set
+	disabled = graph.disabled
+	component = [-1] * graph.size
+	index = [-1] * graph.size
+	low = [0] * graph.size
+	on_stack = bytearray(graph.size)
+	stack: List[int] = []
+	count = components = 0
+	for root in range(graph.size):
+		if index[root] != -1 or disabled[root]:
+			continue
+		index[root] = low[root] = count
+		count += 1
+		stack.append(root)
+		on_stack[root] = 1
+		# iterative DFS: (item, position in its consumers) of the items being visited
+		work = [(root, succ_set_offsets[root])]
+		while work:
+			i, edge = work[-1]
+			end = succ_set_offsets[i + 1]
+			while edge < end:
+				j = succ_set[edge]
+				edge += 1
+				if disabled[j]:
+					continue
+				if index[j] == -1:
+					work[-1] = (i, edge)
+					index[j] = low[j] = count
+					count += 1
+					stack.append(j)
+					on_stack[j] = 1
+					work.append((j, succ_set_offsets[j]))
+					break
+				if on_stack[j] and index[j] < low[i]:
+					low[i] = index[j]
+			else:
+				work.pop()
+				if work:
+					parent = work[-1][0]
+					if low[i] < low[parent]:
+						low[parent] = low[i]
+				if low[i] == index[i]:
+					while True:
+						j = stack.pop()
+						on_stack[j] = 0
+						component[j] = components
+						if j == i:
+							break
+					components += 1
+	return component
+
+class Components:
+	"""
+	The strongly connected components of an Adjacency, as of its {disabled} items when
+	built. Every loop lies within one component, so a loop search from an item only
+	needs its component (see excluded()), and items alone in theirs are on no loop.
+	"""
+
+	def __init__(self, graph: Adjacency) -> None:
+		self.graph = graph
+		self.disabled = bytes(graph.disabled)
+		self.of = component_ids(graph)
+		self.sizes: Dict[int, int] = {}
+		for c in self.of:
+			if c != -1:
+				self.sizes[c] = self.sizes.get(c, 0) + 1
+		# component -> its excluded() flags, built on first use
+		self._excluded: Dict[int, bytearray] = {}
+
+	def members(self) -> List[List[int]]:
+		"""The item ids of each component, largest first."""
+		members: Dict[int, List[int]] = {}
+		for i, c in enumerate(self.of):
+			if c != -1:
+				members.setdefault(c, []).append(i)
+		return sorted(members.values(), key=lambda ids: (-len(ids), ids[0]))
+
+	def on_loops(self, i: int) -> bool:
+		"""Whether item {i} can be on a loop: it is enabled and not alone in its component."""
+		return self.of[i] != -1 and self.sizes[self.of[i]] > 1
+
+	def excluded(self, i: int) -> bytearray:
+		"""
+		Flags of the items that can't be on a loop through item {i}: the disabled items and
+		the items of the other components. Shared, not to be modified.
+		"""
+		c = self.of[i]
+		flags = self._excluded.get(c)
+		if flags is None:
+			of = self.of
+			flags = self._excluded[c] = bytearray(of[j] != c or c == -1
+			                                      for j in range(len(of)))
+		return flags
+
+# Components of the recent graphs, most recent last
+_recent_components: List[Components] = []
+# searches running in the threads of an executor (see LoopFinder) share the memo
+_recent_lock = threading.Lock()
+
+def components_of(graph: Adjacency) -> Components:
+	"""
+	The Components of {graph}, reusing recently built ones while its disabled items are
+	unchanged.
+	"""
+	with _recent_lock:
+		found: Components | None = None
+		for components in _recent_components:
+			if components.graph is graph:
+				_recent_components.remove(components)
+				found = components
+				break
+		if found is None or found.disabled != graph.disabled:
+			found = Components(graph)
+		_recent_components.append(found)
+		del _recent_components[:-RECENT_GRAPHS]
+		return found
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Collection, Iterable, Iterator, List
+
+from model.components import components_of
+from model.profiling import counters
+
+if TYPE_CHECKING:
+	from model.graph import Adjacency
+	from model.loops import Loop
+
+def distances_to(graph: Adjacency, target: int, max_distance: int,
+                 lowest_id: int = 0, excluded: bytearray | None = None) -> List[int]:
+	"""
+	Number of "uses" steps from each item to {target}, following only enabled items with
+	an id of at least {lowest_id} (and not flagged in {excluded}, when given, instead of
+	the disabled items). Items farther than {max_distance} (or unreachable) get
+	max_distance + 1.
+	"""
+	unreachable = max_distance + 1
+	distance = [unreachable] * graph.size
+	distance[target] = 0
+	pred_set_offsets, pred_set = graph.pred_set_offsets, graph.pred_set
+	disabled = graph.disabled if excluded is None else excluded
+	frontier = [target]
+	for step in range(1, max_distance + 1):
+		next_frontier = []
+		for i in frontier:
+			for p in pred_set[pred_set_offsets[i]:pred_set_offsets[i + 1]]:
+				if p >= lowest_id and distance[p] == unreachable and not disabled[p]:
+					distance[p] = step
+					next_frontier.append(p)
+		frontier = next_frontier
+	return distance
+
+def _iter_cycles_through(graph: Adjacency, start: int, min_size: int, max_size: int,
+                         lowest_id: int, required_ids: Collection[int] = (),
+                         excluded: bytearray | None = None) -> Iterator[Loop]:
+	"""
+	Lazily yield every elementary cycle through {start} of {min_size} to {max_size}
+	items, rotated so it begins at {start}, visiting only enabled items with an id of at
+	least {lowest_id} and including every item of {required_ids}. {excluded}, when given,
+	flags the items never visited instead of the disabled items.
+	Branches that cannot get back to {start}, or through the required items not yet
+	visited, within the size bound are pruned.
+	"""
+	succ_set_offsets, succ_set = graph.succ_set_offsets, graph.succ_set
+	if excluded is None:
+		excluded = graph.disabled
+	if excluded[start] or any(r < lowest_id or excluded[r] for r in required_ids):
+		return
+	distance = distances_to(graph, start, max_size - 1, lowest_id, excluded)
+	if all(distance[i] >= max_size
+	       for i in succ_set[succ_set_offsets[start]:succ_set_offsets[start + 1]]):
+		return
+	# (required item, distance from each item to it) for the required items besides start
+	required = [(r, distances_to(graph, r, max_size - 1, lowest_id, excluded))
+	            for r in dict.fromkeys(required_ids) if r != start]
+	if any(distance[r] >= max_size for r, _ in required):
+		return
+
+	# excluded items are never visited
+	visited = bytearray(excluded)
+	visited[start] = 1
+	path = [start]
+	candidates = succ_set[succ_set_offsets[start]:succ_set_offsets[start + 1]]
+	# one iterator over the remaining candidates of each item of {path}
+	stack = [iter(candidates)]
+	# Counted per item rather than per candidate to keep the loop below lean: the
+	# candidates of the items appended to {path}, the items appended, and the candidates
+	# closing a loop. The other candidates were pruned.
+	scanned, expanded, closing = len(candidates), 0, 0
+	try:
+		while stack:
+			size = len(path)
+			for candidate in stack[-1]:
+				if candidate == start:
+					closing += 1
+					if size >= min_size and all(visited[r] for r, _ in required):
+						yield tuple(path)
+					continue
+				# the cycle through {candidate} needs at least distance[candidate] more items
+				if visited[candidate] or size + distance[candidate] > max_size:
+					continue
+				# and at least distance_to_r[candidate] + distance[r] to pass through each
+				# required item r on the way back
+				if required and any(
+					not visited[r] and size + distance_to_r[candidate] + distance[r] > max_size
+					for r, distance_to_r in required):
+					continue
+				# a full-size path only got here if {candidate} uses {start} (distance 1)
+				if size + 1 == max_size:
+					closing += 1
+					yield (*path, candidate)
+					continue
+				visited[candidate] = 1
+				path.append(candidate)
+				candidates = succ_set[succ_set_offsets[candidate]:succ_set_offsets[candidate + 1]]
+				scanned += len(candidates)
+				expanded += 1
+				stack.append(iter(candidates))
+				break
+			else:
+				stack.pop()
+				visited[path.pop()] = 0
+	finally:
+		if counters.enabled:
+			counters.add("dfs.visited", expanded)
+			counters.add("dfs.pruned", scanned - expanded - closing)
+
+def iter_cycle_ids(graph: Adjacency, max_size: int, min_size: int | None = None,
+                   required_ids: Collection[int] = (),
+                   smallest_ids: Iterable[int] | None = None) -> Iterator[Loop]:
+	"""
+	Lazily enumerate every elementary loop of the graph with {min_size} to {max_size}
+	items (exactly {max_size} when {min_size} is not given) that includes all of
+	{required_ids}, each distinct loop exactly once.
+
+	Each loop is only searched from its smallest item id, so rotations of the same loop
+	and the prefixes they share are never walked twice. {smallest_ids} restricts the
+	search to the loops whose smallest item id is one of them.
+
+	Each search only visits the strongly connected component of its starting item, and
+	items alone in their component are not searched at all.
+	"""
+	min_size = max_size if min_size is None else min_size
+	if max_size < 2 or min_size > max_size:
+		return
+	components = components_of(graph)
+	for start in range(graph.size) if smallest_ids is None else smallest_ids:
+		if components.on_loops(start):
+			yield from _iter_cycles_through(graph, start, max(min_size, 2), max_size, start,
+			                                required_ids, components.excluded(start))
+
+def iter_cycle_ids_through(graph: Adjacency, starting_ids: Iterable[int],
+                           max_size: int, min_size: int | None = None,
+                           required_ids: Collection[int] = (), unique: bool = False,
+                           searched_ids: Iterable[int] = ()) -> Iterator[Loop]:
+	"""
+	Lazily enumerate the distinct elementary loops with {min_size} to {max_size} items
+	(exactly {max_size} when {min_size} is not given) through each of {starting_ids},
+	rotated to begin at that starting item, that include all of {required_ids}.
+
+	A loop through several starting items is found from each of them, as one rotation
+	per starting item. With {unique} it is only found from the first of them: the
+	starting items already searched (and {searched_ids}) are never visited again, so
+	the other rotations are never walked. See rotations() to expand them back.
+
+	As in iter_cycle_ids, only the component of each starting item is searched.
+	"""
+	min_size = max_size if min_size is None else min_size
+	if max_size < 2 or min_size > max_size:
+		return
+	components = components_of(graph)
+	searched = list(searched_ids) if unique else []
+	for start in starting_ids:
+		if not components.on_loops(start):
+			continue
+		excluded = components.excluded(start)
+		earlier = [i for i in searched if not excluded[i]]
+		if earlier:
+			excluded = bytearray(excluded)
+			for i in earlier:
+				excluded[i] = 1
+		yield from _iter_cycles_through(graph, start, max(min_size, 2), max_size, 0,
+		                                required_ids, excluded)
+		if unique:
+			searched.append(start)
+
+def iter_mutual_pairs(graph: Adjacency, starting_ids: Iterable[int] | None = None,
+                      required_ids: Collection[int] = (),
+                      unique: bool = False) -> Iterator[Loop]:
+	"""
+	Lazily enumerate the loops of 2 items, pairs of items using each other, in one pass
+	over the adjacency: the consumers of each item that are also its producers.
+	Yields the same loops in the same order as iter_cycle_ids(graph, 2), or with
+	{starting_ids} as iter_cycle_ids_through(graph, starting_ids, 2, unique={unique}).
+	"""
+	required = set(required_ids)
+	if len(required) > 2 or any(graph.disabled[r] for r in required):
+		return
+	succ_set_offsets, succ_set = graph.succ_set_offsets, graph.succ_set
+	pred_set_offsets, pred_set = graph.pred_set_offsets, graph.pred_set
+	disabled = graph.disabled
+	# with {unique}, the starting items already searched
+	searched = set()
+	for start in range(graph.size) if starting_ids is None else starting_ids:
+		if disabled[start] or start in searched:
+			continue
+		producers = set(pred_set[pred_set_offsets[start]:pred_set_offsets[start + 1]])
+		for other in succ_set[succ_set_offsets[start]:succ_set_offsets[start + 1]]:
+			# the whole catalog yields each pair once, from its smallest id
+			if starting_ids is None and other < start or other in searched:
+				continue
+			if other in producers and not disabled[other] and required <= {start, other}:
+				yield start, other
+		if unique:
+			searched.add(start)
+
+def iter_loop_ids(graph: Adjacency, max_size: int, min_size: int | None = None,
+                  starting_ids: Iterable[int] | None = None,
+                  required_ids: Collection[int] = ()) -> Iterator[Loop]:
+	"""
+	Lazily enumerate the unique loops of a `loops` query, with the fastest single process
+	search for it: iter_mutual_pairs for loops of 2 items, iter_cycle_ids_through(...,
+	unique=True) through {starting_ids}, or iter_cycle_ids of the whole catalog.
+	"""
+	min_size = max_size if min_size is None else min_size
+	if max_size == 2 and min_size <= 2:
+		return iter_mutual_pairs(graph, starting_ids, required_ids, unique=True)
+	if starting_ids is not None:
+		return iter_cycle_ids_through(graph, starting_ids, max_size, min_size, required_ids,
+		                              unique=True)
+	return iter_cycle_ids(graph, max_size, min_size, required_ids)
+
+def find_cycle_ids(graph: Adjacency, max_size: int, min_size: int | None = None,
+                   required_ids: Collection[int] = (),
+                   smallest_ids: Iterable[int] | None = None) -> List[Loop]:
+	"""List form of iter_cycle_ids."""
+	return list(iter_cycle_ids(graph, max_size, min_size, required_ids, smallest_ids))
+
+def find_cycle_ids_through(graph: Adjacency, starting_ids: Iterable[int], max_size: int,
+                           min_size: int | None = None,
+                           required_ids: Collection[int] = (), unique: bool = False,
+                           searched_ids: Iterable[int] = ()) -> List[Loop]:
+	"""List form of iter_cycle_ids_through."""
+	return list(iter_cycle_ids_through(graph, starting_ids, max_size, min_size,
+	                                   required_ids, unique, searched_ids))
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, TextIO, Tuple
+
+from model.items import Model, load_csv_files, ryza_csv_load_strategy
+
+ASSETS = Path(__file__).resolve().parent.parent / "assets"
+
+@dataclass(frozen=True)
+class Game:
+	"""
+	The catalog of a game: the csv files holding its items, each loaded with {strategy}
+	and merged in order.
+	"""
+	name: str
+	title: str
+	files: Tuple[str, ...]
+	strategy: Callable[[TextIO], Model]
+
+	def load(self) -> Model:
+		return load_csv_files(self.files, self.strategy)
+
+# name -> game, for the cli --game option
+GAMES: Dict[str, Game] = {}
+DEFAULT_GAME = "ryza_2"
+
+def register_game(game: Game) -> Game:
+	"""Make {game} available by its name, replacing any game of the same name."""
+	GAMES[game.name] = game
+	return game
+
+register_game(Game("ryza_2", "Atelier Ryza 2", (str(ASSETS / "ryza_2_recipes.csv"),),
+                   ryza_csv_load_strategy))
+register_game(Game("ryza", "Atelier Ryza",
+                   (str(ASSETS / "ryza_materials.csv"), str(ASSETS / "ryza_recipes.csv")),
+                   ryza_csv_load_strategy))
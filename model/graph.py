@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+from array import array
+from typing import TYPE_CHECKING, Dict, Iterable, List, Set, Tuple
+
+from model.profiling import counters
+
+if TYPE_CHECKING:
+	from model.items import Item, Model
+
+def uses_label(item: Item, ingredient: Item) -> Tuple[str, str] | None:
+	"""
+	How {item} uses {ingredient}: the (ingredient name or type, recipe entry) that
+	match, checking the name first and then each type against each recipe entry (an
+	entry contained in the type matches). None when {item} doesn't use {ingredient}.
+	"""
+	if ingredient.Name in item.Recipe:
+		return ingredient.Name, ingredient.Name
+	for t in ingredient.Type:
+		for i in item.Recipe:
+			if i in t:
+				return t, i
+	return None
+
+class Adjacency:
+	"""
+	Integer-encoded "uses" relation between item ids, with CSR-style adjacency arrays:
+	the consumers of item {i} are succ[succ_offsets[i]:succ_offsets[i + 1]] and its
+	producers are pred[pred_offsets[i]:pred_offsets[i + 1]]. succ_set / pred_set hold
+	the same adjacency without repeated matches and self references, one edge per pair of
+	items.
+
+	Items flagged in {disabled} are left out of every loop search, so items can be
+	excluded and included again in place, without rebuilding the arrays.
+
+	It only holds flat int arrays, so it is cheap to pickle to worker processes.
+	"""
+	fields = ("succ_offsets", "succ", "pred_offsets", "pred",
+	          "succ_set_offsets", "succ_set", "pred_set_offsets", "pred_set", "disabled")
+
+	def __init__(self, size: int) -> None:
+		self.size = size
+		self.succ_offsets = array("l", [0])
+		self.succ = array("l")
+		self.pred_offsets = array("l", [0])
+		self.pred = array("l")
+		self.succ_set_offsets = array("l", [0])
+		self.succ_set = array("l")
+		self.pred_set_offsets = array("l", [0])
+		self.pred_set = array("l")
+		self.disabled = bytearray(size)
+
+	def adjacency(self) -> Adjacency:
+		"""A bare Adjacency sharing this one's arrays."""
+		adjacency = Adjacency(self.size)
+		for field in self.fields:
+			setattr(adjacency, field, getattr(self, field))
+		return adjacency
+
+	def consumer_ids(self, i: int) -> array[int]:
+		return self.succ[self.succ_offsets[i]:self.succ_offsets[i + 1]]
+
+	def producer_ids(self, i: int) -> array[int]:
+		return self.pred[self.pred_offsets[i]:self.pred_offsets[i + 1]]
+
+class RecipeGraph(Adjacency):
+	"""
+	Adjacency index over a list of items, built once so that "uses" / "ingredient of"
+	lookups become dictionary hits instead of full scans of the item list.
+
+	Maps each item name to the items that consume it (use it as ingredient) and to the
+	items that produce it (are used to craft it), and each category such as "(Gas)" to
+	its member items. Item names are expected to be unique within the list.
+
+	Items are also encoded as integer ids (their position in {items}) so searches can
+	run on ints over the Adjacency arrays, and the uses_label of every edge is resolved
+	once into {edge_labels}, keyed by (consumer id, ingredient id).
+	"""
+
+	def __init__(self, items: List[Item]) -> None:
+		super().__init__(len(items))
+		self.items = items
+		self.position: Dict[str, int] = {}
+		self.by_name: Dict[str, Item] = {}
+		# category -> member items, and lowercase category -> member items
+		self.categories: Dict[str, List[Item]] = {}
+		self._categories_lower: Dict[str, List[Item]] = {}
+		# recipe requirement (name or category) -> positions of the items requiring it
+		self._required_by: Dict[str, List[int]] = {}
+		self.edge_labels: Dict[Tuple[int, int], Tuple[str, str]] = {}
+
+		for pos, item in enumerate(items):
+			self._index(pos, item)
+		self._link()
+
+	@classmethod
+	def from_chunks(cls, chunks: Iterable[Iterable[Item]]) -> RecipeGraph:
+		"""
+		The RecipeGraph of the items of {chunks}, indexing each chunk as it comes (e.g.
+		while a large csv is still being read, see model.ingest) and linking the items
+		once all are indexed.
+		"""
+		graph = cls([])
+		items = graph.items
+		for chunk in chunks:
+			for item in chunk:
+				graph._index(len(items), item)
+				items.append(item)
+		Adjacency.__init__(graph, len(items))
+		graph._link()
+		return graph
+
+	def _index(self, pos: int, item: Item) -> None:
+		self.position.setdefault(item.Name, pos)
+		self.by_name.setdefault(item.Name, item)
+		for t in dict.fromkeys(item.Type):
+			self.categories.setdefault(t, []).append(item)
+		for t in dict.fromkeys(t.lower() for t in item.Type):
+			self._categories_lower.setdefault(t, []).append(item)
+		for requirement in dict.fromkeys(item.Recipe):
+			self._required_by.setdefault(requirement, []).append(pos)
+
+	def _link(self) -> None:
+		"""Fill the adjacency arrays and {edge_labels} of the indexed items."""
+		items = self.items
+		for pos, item in enumerate(items):
+			consumers = self._consumer_ids(item)
+			self.succ.extend(consumers)
+			self.succ_offsets.append(len(self.succ))
+			self.succ_set.extend(dict.fromkeys(consumers))
+			self.succ_set_offsets.append(len(self.succ_set))
+			for consumer in dict.fromkeys(consumers):
+				label = uses_label(items[consumer], item)
+				if label is not None:
+					self.edge_labels[consumer, pos] = label
+			producers = self._producer_ids(item)
+			self.pred.extend(producers)
+			self.pred_offsets.append(len(self.pred))
+			self.pred_set.extend(i for i in dict.fromkeys(producers) if i != pos)
+			self.pred_set_offsets.append(len(self.pred_set))
+
+	@classmethod
+	def from_model(cls, model: Model) -> RecipeGraph:
+		return cls(model.items)
+
+	def id_of(self, item: Item) -> int:
+		return self.position[item.Name]
+
+	def items_of(self, ids: Iterable[int]) -> List[Item]:
+		return [self.items[i] for i in ids]
+
+	def _consumer_ids(self, item: Item) -> List[int]:
+		counts: Dict[int, int] = {}
+		for pos in self._required_by.get(item.Name, []):
+			counts[pos] = 1
+		by_name = set(counts)
+		for t in item.Type:
+			for pos in self._required_by.get(t, []):
+				if pos not in by_name:
+					counts[pos] = counts.get(pos, 0) + 1
+		ids = []
+		for pos in sorted(counts):
+			if self.items[pos] == item:
+				continue
+			ids.extend([pos] * counts[pos])
+		return ids
+
+	def _producer_ids(self, item: Item) -> List[int]:
+		counts: Dict[int, int] = {}
+		for requirement in item.Recipe:
+			pos = self.position.get(requirement)
+			if pos is not None:
+				counts[pos] = 1
+		by_name = set(counts)
+		for requirement in item.Recipe:
+			for member in self.categories.get(requirement, []):
+				pos = self.position[member.Name]
+				if pos not in by_name:
+					counts[pos] = counts.get(pos, 0) + 1
+		ids = []
+		for pos in sorted(counts):
+			ids.extend([pos] * counts[pos])
+		return ids
+
+	def _indexed(self, item: Item) -> int | None:
+		pos = self.position.get(item.Name)
+		if pos is not None and self.items[pos] is not item and self.items[pos] != item:
+			pos = None
+		if counters.enabled:
+			counters.add("index.hits" if pos is not None else "index.misses")
+		return pos
+
+	def consumers_of(self, item: Item) -> List[Item]:
+		"""
+		Items that use {item} as ingredient, either by name or by any of its types.
+		An item matching several of {item}'s types is listed once per matching type.
+		"""
+		pos = self._indexed(item)
+		ids = self._consumer_ids(item) if pos is None else self.consumer_ids(pos)
+		return self.items_of(ids)
+
+	def producers_of(self, item: Item) -> List[Item]:
+		"""
+		Items that are used to craft {item}, either by name or by category.
+		An item matching several of {item}'s recipe categories is listed once per match.
+		"""
+		pos = self._indexed(item)
+		ids = self._producer_ids(item) if pos is None else self.producer_ids(pos)
+		return self.items_of(ids)
+
+	def items_of_category(self, category: str) -> List[Item]:
+		"""Items having {category} as one of their types, case-insensitively."""
+		return list(self._categories_lower.get(category.lower(), []))
+
+# Graphs of the last few item lists, most recent last, so that a session switching
+# between catalogs (e.g. games) keeps their graphs
+RECENT_GRAPHS = 4
+_recent_graphs: List[RecipeGraph] = []
+
+def graph_of(items: List[Item]) -> RecipeGraph:
+	"""
+	Return the RecipeGraph of {items}, reusing a recently built graph when it was built
+	from the very same list.
+	"""
+	for graph in _recent_graphs:
+		if graph.items is items and graph.size == len(items):
+			_recent_graphs.remove(graph)
+			break
+	else:
+		counters.add("graph.built")
+		graph = RecipeGraph(items)
+	_recent_graphs.append(graph)
+	del _recent_graphs[:-RECENT_GRAPHS]
+	return graph
+
+def graph_holding(items: List[Item]) -> Tuple[RecipeGraph, Set[int] | None]:
+	"""
+	A graph indexing every one of {items}: the recent graph of {items} itself, with None,
+	or a recent graph of a catalog they were drawn from (e.g. {items} filtered), with the
+	ids of {items} in it, so that filtered lists don't build a graph of their own on every
+	call. Otherwise the graph of {items}, see graph_of().
+	"""
+	for graph in reversed(_recent_graphs):
+		if graph.items is items and graph.size == len(items):
+			return graph, None
+	for graph in reversed(_recent_graphs):
+		ids = set()
+		for item in items:
+			pos = graph.position.get(item.Name)
+			if pos is None or graph.items[pos] is not item and graph.items[pos] != item:
+				break
+			ids.add(pos)
+		else:
+			return graph, ids
+	return graph_of(items), None
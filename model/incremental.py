@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Collection, Dict, List, Sequence, TextIO, Tuple
+
+from model.cycles import find_cycle_ids, iter_cycle_ids_through
+from model.graph import RecipeGraph
+from model.items import merge_models
+from model.loops import canonical_rotation
+
+if TYPE_CHECKING:
+	from model.items import Model
+	from model.loops import Loop
+
+def load_all_rows(files: Sequence[str], strategy: Callable[[TextIO], Model]) \
+	-> Tuple[Model, List[bool], str]:
+	"""
+	Load every row of {files} with {strategy}, whatever their Include column says.
+	Returns the items, whether each one is included ("X" in the Include column, or no
+	Include column at all) and a key of the csv contents besides the Include column.
+	"""
+	digest = hashlib.sha256()
+	models = []
+	included = []
+	for file in files:
+		with open(file, newline='') as csvfile:
+			reader = csv.DictReader(csvfile, delimiter=',', quotechar='"')
+			fieldnames = [name for name in reader.fieldnames or [] if name != "Include"]
+			rows = list(reader)
+		included += [row.get("Include", "X") == "X" for row in rows]
+
+		# The same csv without the Include column, so that {strategy} keeps every row
+		content = io.StringIO(newline='')
+		writer = csv.DictWriter(content, fieldnames, extrasaction="ignore")
+		writer.writeheader()
+		writer.writerows(rows)
+		text = content.getvalue()
+		digest.update(f"{len(text)}:".encode() + text.encode())
+		models.append(strategy(io.StringIO(text, newline='')))
+	digest.update(f"{strategy.__module__}.{strategy.__qualname__}".encode())
+	return merge_models(models), included, digest.hexdigest()[:32]
+
+@dataclass
+class LoopChanges:
+	"""Loops of a query, and how they changed since it was last answered."""
+	loops: List[Loop]
+	new: List[Loop] = field(default_factory=list)
+	gone: List[Loop] = field(default_factory=list)
+	# True when there was no previous answer (or the csv changed beyond Include)
+	baseline: bool = False
+
+class IncrementalCatalog:
+	"""
+	A graph of every row of the csv {files}, where rows excluded by the Include column
+	are disabled items. refresh() re-reads the Include column and flips the changed
+	items in place, and loop_changes() updates the loops of a query by only searching
+	through the newly included items and dropping the loops through newly excluded
+	ones.
+
+	Any other change to the csv rebuilds the graph and drops the known loops.
+	"""
+
+	def __init__(self, files: Sequence[str], strategy: Callable[[TextIO], Model]) -> None:
+		self.files = tuple(files)
+		self.strategy = strategy
+		self.content_key: str | None = None
+		self.graph: RecipeGraph | None = None
+		# query -> (graph.disabled when the loops were searched, loops)
+		self.queries: Dict[Tuple[int, int, Tuple[int, ...]], Tuple[bytes, List[Loop]]] = {}
+
+	def refresh(self) -> Tuple[List[int], List[int]]:
+		"""
+		Reload the csv and apply its Include column to the graph in place.
+		Returns the ids of the newly included and of the newly excluded items.
+		"""
+		model, included, content_key = load_all_rows(self.files, self.strategy)
+		disabled = bytearray(not flag for flag in included)
+		if content_key != self.content_key or self.graph is None:
+			self.content_key = content_key
+			self.graph = RecipeGraph(model.items)
+			self.graph.disabled[:] = disabled
+			self.queries.clear()
+			return [], []
+
+		newly_included = [i for i in range(self.graph.size)
+		                  if self.graph.disabled[i] and not disabled[i]]
+		newly_excluded = [i for i in range(self.graph.size)
+		                  if disabled[i] and not self.graph.disabled[i]]
+		self.graph.disabled[:] = disabled
+		return newly_included, newly_excluded
+
+	def loop_changes(self, max_size: int, min_size: int | None = None,
+	                 required_ids: Collection[int] = ()) -> LoopChanges:
+		"""
+		The catalog-wide loops of {min_size} to {max_size} items including all of
+		{required_ids} (see find_cycle_ids), and which of them are new or gone since
+		the last call with the same arguments.
+		"""
+		graph = self.graph
+		assert graph is not None, "refresh() must be called first"
+		min_size = max_size if min_size is None else min_size
+		query = (max_size, min_size, tuple(sorted(set(required_ids))))
+		if query not in self.queries:
+			loops = find_cycle_ids(graph, max_size, min_size, required_ids)
+			self.queries[query] = (bytes(graph.disabled), loops)
+			return LoopChanges(loops, baseline=True)
+
+		searched_with, previous = self.queries[query]
+		disabled = graph.disabled
+		gone = [loop for loop in previous if any(disabled[i] for i in loop)]
+		newly_included = [i for i in range(graph.size)
+		                  if searched_with[i] and not disabled[i]]
+		# a loop through several newly included items is only found from the first
+		found = iter_cycle_ids_through(graph, newly_included, max_size, min_size,
+		                               required_ids, unique=True)
+		new = [canonical_rotation(loop) for loop in found]
+
+		gone_set = set(gone)
+		loops = [loop for loop in previous if loop not in gone_set] + new
+		self.queries[query] = (bytes(disabled), loops)
+		return LoopChanges(loops, new, gone)
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import csv
+import time
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from model.graph import RecipeGraph
+from model.items import (Item, RowParser, datamined_csv_row_parser, ryza_2_csv_row_parser,
+                         ryza_csv_row_parser)
+from model.profiling import peak_memory_bytes
+
+# format name -> the row parser of the csv files in that format, given their columns
+ROW_PARSERS: Dict[str, Callable[[Sequence[str]], RowParser]] = {
+	"ryza": ryza_csv_row_parser,
+	"ryza_2": ryza_2_csv_row_parser,
+	"datamined": datamined_csv_row_parser,
+}
+
+@dataclass
+class IngestStats:
+	"""What an ingestion read, and how fast."""
+	rows: int = 0
+	items: int = 0
+	chunks: int = 0
+	seconds: float = 0.0
+	# peak resident set size of the process, when available
+	peak_memory: int | None = None
+
+	@property
+	def rows_per_second(self) -> float:
+		return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+def iter_item_chunks(files: Sequence[str], row_parser: Callable[[Sequence[str]], RowParser],
+                     chunk_size: int = 4096,
+                     stats: IngestStats | None = None) -> Iterator[List[Item]]:
+	"""
+	Stream the items of the csv {files}, parsed by the {row_parser} of each file's
+	columns, in chunks of the items of up to {chunk_size} rows. Only one chunk of rows
+	is held at a time, never a whole file. {stats} is updated as chunks are read.
+	"""
+	if chunk_size < 1:
+		raise ValueError(f"chunk_size must be at least 1, not {chunk_size}")
+	for file in files:
+		with open(file, newline='') as csvfile:
+			reader = csv.DictReader(csvfile, delimiter=',', quotechar='"')
+			parse = row_parser(reader.fieldnames or [])
+			while True:
+				rows = list(islice(reader, chunk_size))
+				if not rows:
+					break
+				items = [item for item in map(parse, rows) if item is not None]
+				if stats is not None:
+					stats.rows += len(rows)
+					stats.items += len(items)
+					stats.chunks += 1
+				yield items
+
+def ingest_csv_files(files: Sequence[str], row_parser: Callable[[Sequence[str]], RowParser],
+                     chunk_size: int = 4096) -> Tuple[RecipeGraph, IngestStats]:
+	"""
+	The RecipeGraph of the items of the csv {files} (see iter_item_chunks), each chunk
+	indexed into the graph as soon as it is read, with the stats of the ingestion.
+	"""
+	stats = IngestStats()
+	start = time.perf_counter()
+	graph = RecipeGraph.from_chunks(iter_item_chunks(files, row_parser, chunk_size, stats))
+	stats.seconds = time.perf_counter() - start
+	stats.peak_memory = peak_memory_bytes()
+	return graph, stats
@@ -1,19 +1,26 @@
 from __future__ import annotations
 
 import csv
-from typing import List, TextIO, Callable
+from dataclasses import dataclass, field
+from sys import intern
+from typing import Callable, Dict, Iterable, List, Sequence, TextIO
 
-from pydantic import BaseModel
-
-class Item(BaseModel):
+# Plain slotted records: the loaders build them directly without validation, which is
+# opt-in through model.validation (the cli --validate option).
+@dataclass(slots=True)
+class Item:
 	Name: str
 	Type: List[str]
 	Recipe: List[str]
-	Effects: List[str] = []
+	Effects: List[str] = field(default_factory=list)
 
-class Model(BaseModel):
+@dataclass(slots=True)
+class Model:
 	items: List[Item]
 
+# Turns a csv row (a dict of column -> value) into an Item, or None to skip the row
+RowParser = Callable[[Dict[str, str]], Item | None]
+
 def ryza_csv_load_strategy(file: TextIO) -> Model:
 	"""
 	Load data from a csv file.
@@ -21,6 +28,19 @@ def ryza_csv_load_strategy(file: TextIO) -> Model:
 	Type = ["Category 1", "Category 2", "Category 3", "Category 4", "Add Category 1",
 	"Add Category 2"]
 	Effects = ["SQ+1", "SQ+2", "ES+1", "ES+2", "ES+3"]
+	The item name is in the "Item" column (ryza_2_recipes.csv) or the "Name" column
+	(ryza_materials.csv and ryza_recipes.csv). ryza_2_recipes.csv has the level of each
+	effect in its "ES", "SQ" and "EV" columns instead, labeled as ryza_2_csv_load_strategy
+	does.
+	"""
+	reader = csv.DictReader(file, delimiter=',', quotechar='"')
+	parse = ryza_csv_row_parser(reader.fieldnames or [])
+	return Model(items=[item for item in map(parse, reader) if item is not None])
+
+def ryza_csv_row_parser(fieldnames: Sequence[str]) -> RowParser:
+	"""
+	Parser of the rows of a csv with {fieldnames} as ryza_csv_load_strategy reads them,
+	skipping the rows not included by the "Include" column.
 	"""
 	type_columns = ["Category 1", "Category 2", "Category 3", "Category 4",
 	                "Add Category 1", "Add Category 2"]
@@ -29,28 +49,23 @@ def ryza_csv_load_strategy(file: TextIO) -> Model:
 	effects_values = ["Synth Quantity +1", "Synth Quantity +2", "Effect Spread +1",
 	                  "Effect Spread +2", "Effect Spread +3"]
 	effect_from_column_name = lambda x: effects_values[effects_columns.index(x)]
-	model = Model(items=[])
+	level_columns = {"SQ": "Synth Quantity", "ES": "Effect Spread", "EV": "EV"}
+	name_column = "Item" if "Item" in fieldnames else "Name"
 
-	reader = csv.DictReader(file, delimiter=',', quotechar='"')
-	for row in reader:
+	# Category and ingredient names repeat across rows, so they are interned
+	def parse(row: Dict[str, str]) -> Item | None:
 		if "Include" in row and row["Include"] != "X":
-			continue
-		item = Item(
-			Name=row['Item'],
-			Type=[],
-			Recipe=[])
-		for column in type_columns:
-			if column in row and row[column] != "":
-				item.Type.append(row[column])
-		for column in recipe_columns:
-			if column in row and row[column] != "":
-				item.Recipe.append(row[column])
-		for column in effects_columns:
-			if column in row and row[column] != "":
-				item.Effects.append(effect_from_column_name(column))
-		model.items.append(item)
+			return None
+		return Item(
+			Name=intern(row[name_column]),
+			Type=[intern(row[column]) for column in type_columns if row.get(column)],
+			Recipe=[intern(row[column]) for column in recipe_columns if row.get(column)],
+			Effects=[effect_from_column_name(column) for column in effects_columns
+			         if row.get(column)]
+			        + [f"{label} +{row[column]}" for column, label in level_columns.items()
+			           if row.get(column)])
 
-	return model
+	return parse
 
 def ryza_2_csv_load_strategy(file: TextIO) -> Model:
 	"""
@@ -59,6 +74,16 @@ def ryza_2_csv_load_strategy(file: TextIO) -> Model:
 	Type = ["Category 1", "Category 2", "Category 3", "Category 4", "Add Category 1",
 	"Add Category 2"]
 	Effects = ["ES", "SQ", "EV"]
+	The item name is in the "Name" column, or the "Item" column.
+	"""
+	reader = csv.DictReader(file, delimiter=',', quotechar='"')
+	parse = ryza_2_csv_row_parser(reader.fieldnames or [])
+	return Model(items=[item for item in map(parse, reader) if item is not None])
+
+def ryza_2_csv_row_parser(fieldnames: Sequence[str]) -> RowParser:
+	"""
+	Parser of the rows of a csv with {fieldnames} as ryza_2_csv_load_strategy reads
+	them, skipping the rows not included by the "Include" column.
 	"""
 	type_columns = ["Category 1", "Category 2", "Category 3", "Category 4",
 	                "Add Category 1", "Add Category 2"] # "Add Category 3", "Add Category 4"
@@ -69,29 +94,45 @@ def ryza_2_csv_load_strategy(file: TextIO) -> Model:
 		"EV": "EV"
 	}
 	effect_label_of = lambda col, val: f"{effects_abrev_expanded[col]} +{val}"
-	model = Model(items=[])
+	recipe_columns = [column for column in fieldnames
+	                  if column.startswith(recipe_column_prefix)]
+	name_column = "Item" if "Item" in fieldnames else "Name"
 
-	reader = csv.DictReader(file, delimiter=',', quotechar='"')
-	for row in reader:
+	# Category and ingredient names repeat across rows, so they are interned
+	def parse(row: Dict[str, str]) -> Item | None:
 		if "Include" in row and row["Include"] != "X":
-			continue
-		item = Item(
-			Name=row['Name'],
-			Type=[],
-			Recipe=[])
-		for column in type_columns:
-			if column in row and row[column] != "":
-				item.Type.append(row[column])
-		for column in row.keys():
-			if column.startswith(recipe_column_prefix) and row[column] != "":
-				item.Recipe.append(row[column])
-		for column in effects_abrev_expanded.keys():
-			value = row[column]
-			if column in row and value != "":
-				item.Effects.append(effect_label_of(column, value))
-		model.items.append(item)
+			return None
+		return Item(
+			Name=intern(row[name_column]),
+			Type=[intern(row[column]) for column in type_columns if row.get(column)],
+			Recipe=[intern(row[column]) for column in recipe_columns if row.get(column)],
+			Effects=[effect_label_of(column, row[column])
+			         for column in effects_abrev_expanded.keys() if row.get(column)])
 
-	return model
+	return parse
+
+def datamined_csv_row_parser(fieldnames: Sequence[str]) -> RowParser:
+	"""
+	Parser of the rows of a data-mined item dump (e.g. ryza_2_items.csv), with the item
+	name in the "name" column, its categories in "Category 1" and the
+	"category/N/name" columns, and each of its ingredient sets in an
+	"ingredient_set/N/ing" column. The ingredient sets are merged into one Recipe, each
+	ingredient once, in column order.
+	"""
+	type_columns = [column for column in fieldnames if column == "Category 1"
+	                or column.startswith("category/") and column.endswith("/name")]
+	recipe_columns = [column for column in fieldnames
+	                  if column.startswith("ingredient_set/") and column.endswith("/ing")]
+
+	def parse(row: Dict[str, str]) -> Item | None:
+		return Item(
+			Name=intern(row["name"]),
+			Type=list(dict.fromkeys(intern(row[column]) for column in type_columns
+			                        if row.get(column))),
+			Recipe=list(dict.fromkeys(intern(row[column]) for column in recipe_columns
+			                          if row.get(column))))
+
+	return parse
 
 def load_csv_data(file: str, strategy: Callable[[TextIO], Model]) -> Model:
 	"""
@@ -101,6 +142,21 @@ def load_csv_data(file: str, strategy: Callable[[TextIO], Model]) -> Model:
 		model = strategy(csvfile)
 	return model
 
+def merge_models(models: Iterable[Model]) -> Model:
+	"""One Model with the items of each of {models}, in order."""
+	return Model(items=[item for model in models for item in model.items])
+
+def load_csv_files(files: Sequence[str], strategy: Callable[[TextIO], Model]) -> Model:
+	"""
+	Load each of {files} using a strategy into one Model, with the items in the order of
+	{files}. Several files are loaded concurrently.
+	"""
+	if len(files) == 1:
+		return load_csv_data(files[0], strategy)
+	from concurrent.futures import ThreadPoolExecutor
+	with ThreadPoolExecutor(max_workers=len(files)) as executor:
+		return merge_models(executor.map(load_csv_data, files, [strategy] * len(files)))
+
 if __name__ == "__main__":
 	materials = load_csv_data("./../assets/ryza_materials.csv", ryza_csv_load_strategy)
 	recipes = load_csv_data("./../assets/ryza_recipes.csv", ryza_csv_load_strategy)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Collection, Iterable, List, Tuple
+
+from model.components import components_of
+from model.profiling import counters
+
+if TYPE_CHECKING:
+	from model.graph import Adjacency
+
+# A loop is a tuple of item ids where each item uses the previous one as ingredient and
+# the first item uses the last one.
+Loop = Tuple[int, ...]
+
+def canonical_rotation(loop: Loop) -> Loop:
+	"""{loop} rotated to begin at its smallest id, as the catalog-wide search finds it."""
+	i = loop.index(min(loop))
+	return loop[i:] + loop[:i]
+
+def rotations(loop: Loop, starting_ids: Collection[int] | None = None) -> List[Loop]:
+	"""
+	The rotations of {loop} beginning at each of its items, or only at the items of
+	{starting_ids}, in loop order: what a search from every item (or from each of
+	{starting_ids}) finds of the loop that a unique search finds once.
+	"""
+	return [loop[i:] + loop[:i] for i in range(len(loop))
+	        if starting_ids is None or loop[i] in starting_ids]
+
+def _extend_sequence(graph: Adjacency, path: List[int], sequence_size: int,
+                     visited: bytearray, ending: bytearray, sequences: List[Loop]) -> None:
+	"""
+	Depth-first extension of {path} up to {sequence_size} items, appending every
+	sequence that ends in an {ending} item to {sequences}.
+	{visited} must flag exactly the items of {path}; it is restored before returning.
+	"""
+	succ_offsets, succ = graph.succ_offsets, graph.succ
+	# candidates looked at and items appended to {path}, see model.profiling
+	scanned = expanded = 0
+	found = len(sequences)
+
+	def extend(current: int) -> None:
+		nonlocal scanned, expanded
+		candidates = succ[succ_offsets[current]:succ_offsets[current + 1]]
+		scanned += len(candidates)
+		if len(path) == sequence_size - 1:
+			for candidate in candidates:
+				if ending[candidate] and not visited[candidate]:
+					sequences.append((*path, candidate))
+			return
+		for candidate in candidates:
+			if visited[candidate]:
+				continue
+			expanded += 1
+			visited[candidate] = 1
+			path.append(candidate)
+			extend(candidate)
+			path.pop()
+			visited[candidate] = 0
+
+	extend(path[-1])
+	if counters.enabled:
+		counters.add("dfs.visited", expanded)
+		counters.add("dfs.pruned", scanned - expanded - (len(sequences) - found))
+
+def find_sequence_ids(graph: Adjacency,
+                      sequence: List[int],
+                      sequence_size: int,
+                      ending_ids: Iterable[int]) -> List[Loop]:
+	"""
+	Find all sequences of {sequence_size} item ids extending {sequence}, where each item
+	uses the previous one as ingredient and the last item is one of {ending_ids}.
+	No item appears twice in a sequence.
+	"""
+	sequences: List[Loop] = []
+	if len(sequence) == 0 or len(sequence) >= sequence_size:
+		return sequences
+
+	# disabled items are never visited
+	visited = bytearray(graph.disabled)
+	ending = bytearray(graph.size)
+	for i in ending_ids:
+		ending[i] = 1
+	for i in sequence:
+		visited[i] = 1
+	_extend_sequence(graph, list(sequence), sequence_size, visited, ending, sequences)
+	return sequences
+
+def find_loop_ids(graph: Adjacency, loop_size: int,
+                  starting_ids: Iterable[int]) -> List[Loop]:
+	"""
+	Find all loops of {loop_size} items starting from each of {starting_ids}.
+	Each search only extends through the strongly connected component of its starting
+	item, the only items that lead back to it.
+	"""
+	loops: List[Loop] = []
+	if loop_size < 2:
+		return loops
+
+	components = components_of(graph)
+	ending = bytearray(graph.size)
+	for start in starting_ids:
+		if not components.on_loops(start):
+			continue
+		ending_ids = [i for i in graph.producer_ids(start) if i != start]
+		if len(ending_ids) == 0:
+			continue
+		for i in ending_ids:
+			ending[i] = 1
+		# items of other components (and disabled items) are never visited
+		visited = bytearray(components.excluded(start))
+		visited[start] = 1
+		_extend_sequence(graph, [start], loop_size, visited, ending, loops)
+		for i in ending_ids:
+			ending[i] = 0
+	return loops
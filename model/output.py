@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import TYPE_CHECKING, Callable, List, TextIO
+
+if TYPE_CHECKING:
+	from model.graph import RecipeGraph
+	from model.items import Item
+	from model.loops import Loop
+
+FORMATS = ("text", "jsonl", "csv")
+
+class LoopWriter:
+	"""
+	Writes loops to {stream} as text (one {explain} of the loop items per loop), JSON
+	Lines (one array per loop) or csv (one row per loop). The machine-readable formats
+	hold the item names of each loop, or their ids with {ids}.
+
+	Loops are formatted into a buffer written to {stream} every {batch} loops and on
+	flush(), instead of one write per loop. {tag_name} is the JSON key of the tags given
+	to write().
+	"""
+
+	def __init__(self, stream: TextIO, graph: RecipeGraph, format: str = "text",
+	             ids: bool = False,
+	             explain: Callable[[List[Item], RecipeGraph], str] | None = None,
+	             batch: int = 512, tag_name: str = "change") -> None:
+		if format not in FORMATS:
+			raise ValueError(f"Unknown format {format!r}, expected one of {FORMATS}")
+		if format == "text" and explain is None:
+			raise ValueError("The text format needs an explain function")
+		self.stream = stream
+		self.graph = graph
+		self.format = format
+		self.ids = ids
+		self.explain = explain
+		self.batch = batch
+		self.tag_name = tag_name
+		self.count = 0
+		self._buffer = io.StringIO()
+		self._csv = csv.writer(self._buffer, lineterminator="\n")
+		self._pending = 0
+
+	def write(self, loop: Loop, tag: str | float | None = None) -> None:
+		"""
+		Write {loop}, marked with {tag} (e.g. "+" or "-", or a score) when given: before
+		the text, as the first csv column, or as {"change": tag, "loop": [...]} in JSON
+		Lines (with {tag_name} as key).
+		"""
+		if self.format == "text":
+			assert self.explain is not None
+			text = self.explain(self.graph.items_of(loop), self.graph)
+			self._buffer.write(f"{tag} {text}\n" if tag is not None else f"{text}\n")
+		else:
+			row: List[int | str] = list(loop) if self.ids else [self.graph.items[i].Name for i in loop]
+			if self.format == "csv":
+				self._csv.writerow(row if tag is None else [tag, *row])
+			else:
+				value = row if tag is None else {self.tag_name: tag, "loop": row}
+				self._buffer.write(json.dumps(value, separators=(",", ":")))
+				self._buffer.write("\n")
+		self.count += 1
+		self._pending += 1
+		if self._pending >= self.batch:
+			self.flush()
+
+	def flush(self) -> None:
+		if self._pending:
+			self.stream.write(self._buffer.getvalue())
+			self._buffer.seek(0)
+			self._buffer.truncate()
+			self._pending = 0
+		self.stream.flush()
+
+	def __enter__(self) -> LoopWriter:
+		return self
+
+	def __exit__(self, *_: object) -> None:
+		self.flush()
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Collection, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from model.cycles import find_cycle_ids, find_cycle_ids_through
+from model.graph import Adjacency
+from model.loops import Loop
+from model.profiling import counters, peak_memory_bytes
+
+# Set once per worker process by _init_worker, so tasks only carry item ids
+_worker_graph: Adjacency | None = None
+
+def _init_worker(graph: Adjacency) -> None:
+	global _worker_graph
+	_worker_graph = graph
+
+def _search_chunk(task: Tuple[List[int], bool, int, int, List[int], bool, List[int], bool]) \
+	-> Tuple[List[Loop], Dict[str, int], int | None]:
+	"""
+	The loops of a chunk of starting items, with the counters of the search and the
+	peak memory of the worker when {counting} (for the --profile report of the parent).
+	"""
+	starting_ids, canonical, max_size, min_size, required_ids, unique, searched_ids, \
+		counting = task
+	assert _worker_graph is not None
+	counters.reset()
+	counters.enabled = counting
+	try:
+		if canonical:
+			loops = find_cycle_ids(_worker_graph, max_size, min_size, required_ids,
+			                       starting_ids)
+		else:
+			loops = find_cycle_ids_through(_worker_graph, starting_ids, max_size, min_size,
+			                               required_ids, unique, searched_ids)
+	finally:
+		counters.enabled = False
+	if not counting:
+		return loops, {}, None
+	return loops, dict(counters.counts), peak_memory_bytes()
+
+def _chunks(ids: Sequence[int], jobs: int) -> Iterator[Tuple[int, List[int]]]:
+	# Many small chunks so that the few starting items with most of the work do not
+	# leave the other workers idle
+	chunk_size = max(1, len(ids) // (jobs * 16))
+	for i in range(0, len(ids), chunk_size):
+		yield i, list(ids[i:i + chunk_size])
+
+def iter_cycle_ids_parallel(graph: Adjacency, jobs: int, max_size: int,
+                            min_size: int | None = None,
+                            required_ids: Collection[int] = (),
+                            starting_ids: Iterable[int] | None = None,
+                            unique: bool = False) -> Iterator[Loop]:
+	"""
+	Parallel form of iter_cycle_ids (when {starting_ids} is None) and
+	iter_cycle_ids_through, spreading the starting items over {jobs} worker processes.
+
+	Only the bare Adjacency arrays are sent to the workers, once each; tasks and results
+	are plain item ids. Repeated starting items are searched once, and since every
+	starting item yields its own disjoint set of loops, results are merged in starting
+	item order, in the same order as the sequential search. With {unique}, each chunk
+	also carries the starting items before it, whose loops it leaves out. While the
+	counters are enabled, the workers' counters are added to them.
+	"""
+	min_size = max_size if min_size is None else min_size
+	canonical = starting_ids is None
+	ids = range(graph.size) if starting_ids is None else list(dict.fromkeys(starting_ids))
+	tasks = ((chunk, canonical, max_size, min_size, list(required_ids), unique,
+	          list(ids[:i]) if unique and not canonical else [], counters.enabled)
+	         for i, chunk in _chunks(ids, jobs))
+
+	executor = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+	                               initargs=(graph.adjacency(),))
+	try:
+		for loops, counts, peak_memory in executor.map(_search_chunk, tasks):
+			# the workers' search counters, added up into this process's
+			counters.merge(counts, peak_memory)
+			yield from loops
+	finally:
+		executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, Iterator, List
+
+from model.cycles import distances_to
+from model.profiling import counters
+
+if TYPE_CHECKING:
+	from model.graph import Adjacency
+	from model.loops import Loop
+
+def _path_through(meeting: int, forward: Dict[int, int], backward: Dict[int, int]) -> Loop:
+	path = [meeting]
+	while forward[path[0]] != -1:
+		path.insert(0, forward[path[0]])
+	while backward[path[-1]] != -1:
+		path.append(backward[path[-1]])
+	return tuple(path)
+
+def shortest_path_ids(graph: Adjacency, source: int, target: int,
+                      max_depth: int) -> Loop | None:
+	"""
+	A shortest path of at most {max_depth} "uses" steps from {source} to {target}: the
+	item ids from {source} to {target}, each item using the previous one as ingredient,
+	through enabled items only. None when there is no such path.
+
+	Bidirectional BFS: the smaller of the frontiers from {source} (following the
+	consumers) and from {target} (following the producers) is expanded one level at a
+	time until they meet, visiting about the square root of the items a one-sided
+	search would.
+	"""
+	disabled = graph.disabled
+	if disabled[source] or disabled[target]:
+		return None
+	if source == target:
+		return (source,)
+	# item -> the item it was reached from, -1 for the ends
+	forward = {source: -1}
+	backward = {target: -1}
+	forward_frontier, backward_frontier = [source], [target]
+	depth = visited = 0
+	try:
+		while forward_frontier and backward_frontier and depth < max_depth:
+			depth += 1
+			if len(forward_frontier) <= len(backward_frontier):
+				offsets, adjacent = graph.succ_set_offsets, graph.succ_set
+				frontier, reached, other = forward_frontier, forward, backward
+			else:
+				offsets, adjacent = graph.pred_set_offsets, graph.pred_set
+				frontier, reached, other = backward_frontier, backward, forward
+			next_frontier = []
+			for i in frontier:
+				for j in adjacent[offsets[i]:offsets[i + 1]]:
+					if j in reached or disabled[j]:
+						continue
+					reached[j] = i
+					if j in other:
+						return _path_through(j, forward, backward)
+					next_frontier.append(j)
+			visited += len(next_frontier)
+			if frontier is forward_frontier:
+				forward_frontier = next_frontier
+			else:
+				backward_frontier = next_frontier
+		return None
+	finally:
+		if counters.enabled:
+			counters.add("bfs.visited", visited)
+
+def iter_path_ids(graph: Adjacency, source: int, target: int,
+                  max_depth: int) -> Iterator[Loop]:
+	"""
+	Lazily enumerate the paths without repeated items of at most {max_depth} "uses"
+	steps from {source} to {target} (see shortest_path_ids), shortest first, and in
+	item id order among paths of the same length.
+
+	The shortest length comes from shortest_path_ids(); the paths of each length are
+	then walked depth-first, only following items from which {target} is still within
+	the remaining steps, so hardly any branch is walked in vain.
+	"""
+	shortest = shortest_path_ids(graph, source, target, max_depth)
+	if shortest is None:
+		return
+	if len(shortest) == 1:
+		yield shortest
+		return
+	succ_set_offsets, succ_set = graph.succ_set_offsets, graph.succ_set
+	distance = distances_to(graph, target, max_depth)
+	for length in range(len(shortest) - 1, max_depth + 1):
+		visited = bytearray(graph.disabled)
+		visited[source] = 1
+		path = [source]
+		stack = [iter(succ_set[succ_set_offsets[source]:succ_set_offsets[source + 1]])]
+		while stack:
+			steps = len(path)
+			for candidate in stack[-1]:
+				if candidate == target:
+					if steps == length:
+						yield (*path, target)
+					continue
+				if visited[candidate] or steps + distance[candidate] > length:
+					continue
+				visited[candidate] = 1
+				path.append(candidate)
+				stack.append(iter(
+					succ_set[succ_set_offsets[candidate]:succ_set_offsets[candidate + 1]]))
+				break
+			else:
+				stack.pop()
+				visited[path.pop()] = 0
+
+def find_path_ids(graph: Adjacency, source: int, target: int, max_depth: int,
+                  limit: int = 1) -> List[Loop]:
+	"""
+	The {limit} shortest paths from {source} to {target}, see iter_path_ids(). A single
+	path is answered by shortest_path_ids() alone.
+	"""
+	if limit == 1:
+		path = shortest_path_ids(graph, source, target, max_depth)
+		return [] if path is None else [path]
+	paths: List[Loop] = []
+	for path in iter_path_ids(graph, source, target, max_depth):
+		if len(paths) == limit:
+			break
+		paths.append(path)
+	return paths
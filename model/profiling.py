@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+class Counters:
+	"""
+	Named counters and per-phase wall times, only recorded while {enabled}.
+
+	The searches count in local variables and add them once when they end, and other
+	code checks `counters.enabled` before doing any extra work, so disabled counters
+	cost about one attribute lookup per call.
+
+	Phase times exclude the phases nested in them: in
+	`with phase("output"): for x in timed("search", xs): ...` the output phase doesn't
+	include the time spent searching.
+	"""
+
+	def __init__(self) -> None:
+		self.enabled = False
+		self.counts: Dict[str, int] = {}
+		self.phases: Dict[str, float] = {}
+		# the highest peak memory of the worker processes counting for this process
+		self.worker_peak_memory: int | None = None
+		# (phase, time it was last resumed) of the running phases, innermost last
+		self._running: List[Tuple[str, float]] = []
+
+	def reset(self) -> None:
+		self.counts.clear()
+		self.phases.clear()
+		self.worker_peak_memory = None
+		self._running.clear()
+
+	def merge(self, counts: Dict[str, int], peak_memory: int | None) -> None:
+		"""Add the {counts} and {peak_memory} of a worker process."""
+		for name, count in counts.items():
+			self.add(name, count)
+		if self.enabled and peak_memory is not None:
+			self.worker_peak_memory = max(self.worker_peak_memory or 0, peak_memory)
+
+	def add(self, name: str, count: int = 1) -> None:
+		if self.enabled:
+			self.counts[name] = self.counts.get(name, 0) + count
+
+	def _enter(self, name: str) -> None:
+		now = time.perf_counter()
+		if self._running:
+			parent, resumed = self._running[-1]
+			self.phases[parent] = self.phases.get(parent, 0.0) + now - resumed
+		self._running.append((name, now))
+
+	def _exit(self) -> None:
+		now = time.perf_counter()
+		name, resumed = self._running.pop()
+		self.phases[name] = self.phases.get(name, 0.0) + now - resumed
+		if self._running:
+			self._running[-1] = (self._running[-1][0], now)
+
+	@contextmanager
+	def phase(self, name: str) -> Iterator[None]:
+		"""Add the time spent in the block to phase {name}."""
+		if not self.enabled:
+			yield
+			return
+		self._enter(name)
+		try:
+			yield
+		finally:
+			self._exit()
+
+	def timed(self, name: str, iterator: Iterator[T]) -> Iterator[T]:
+		"""
+		{iterator}, adding the time spent producing each item to phase {name}, or
+		{iterator} itself when disabled.
+		"""
+		if not self.enabled:
+			return iterator
+		return self._timed(name, iterator)
+
+	def _timed(self, name: str, iterator: Iterator[T]) -> Iterator[T]:
+		while True:
+			self._enter(name)
+			try:
+				item = next(iterator)
+			except StopIteration:
+				return
+			finally:
+				self._exit()
+			yield item
+
+	def report(self) -> str:
+		"""The phases, counters and peak memory, one per line."""
+		lines = ["Phases:"]
+		lines += [f"  {name:<32} {seconds * 1000:10.1f} ms"
+		          for name, seconds in self.phases.items()]
+		lines.append("Counters:")
+		lines += [f"  {name:<32} {count:10d}" for name, count in sorted(self.counts.items())]
+		peak = peak_memory_bytes()
+		if peak is not None:
+			lines.append(f"Peak memory: {peak / 2**20:.1f} MB")
+		if self.worker_peak_memory is not None:
+			lines.append(f"Peak memory of a worker: {self.worker_peak_memory / 2**20:.1f} MB")
+		return "\n".join(lines)
+
+# The counters updated by the model and the cli
+counters = Counters()
+
+def peak_memory_bytes() -> int | None:
+	"""Peak resident set size of the process, None where it isn't available (Windows)."""
+	try:
+		import resource
+	except ImportError:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# kilobytes on Linux, bytes on macOS
+	return peak if sys.platform == "darwin" else peak * 1024
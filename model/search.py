@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, AbstractSet, Dict, Iterable, List, Set, Tuple
+
+from model.graph import RECENT_GRAPHS
+
+if TYPE_CHECKING:
+	from model.graph import RecipeGraph
+	from model.items import Item
+
+# Names are indexed by their n-grams of up to GRAM letters, and fuzzy matched by their
+# FUZZY_GRAM-grams
+GRAM = 3
+FUZZY_GRAM = 2
+
+def _grams(text: str, n: int) -> Set[str]:
+	return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+class SearchIndex:
+	"""
+	Text index over the items of a RecipeGraph, built once so that searches by name,
+	category and effect are dictionary hits and set intersections instead of lowercasing
+	and scanning every item per query. Results are sets of item ids, see ids_to_items().
+
+	Names are indexed by the lowercase 1 to {GRAM}-grams of " name ": a substring query
+	only checks the names sharing all of its n-grams, and a fuzzy query ranks the names
+	sharing most of its {FUZZY_GRAM}-grams.
+	"""
+
+	def __init__(self, graph: RecipeGraph) -> None:
+		self.graph = graph
+		self.names_lower = [item.Name.lower() for item in graph.items]
+		self.all_ids = frozenset(range(graph.size))
+		self.craftable = frozenset(i for i, item in enumerate(graph.items) if item.Recipe)
+		# n-gram -> ids of the names containing it
+		self._name_grams: Dict[str, Set[int]] = {}
+		# lowercase category -> ids, and lowercase effect -> ids
+		self._categories: Dict[str, Set[int]] = {}
+		self._effects: Dict[str, Set[int]] = {}
+
+		for i, item in enumerate(graph.items):
+			name = f" {self.names_lower[i]} "
+			for n in range(1, GRAM + 1):
+				for gram in _grams(name, n):
+					self._name_grams.setdefault(gram, set()).add(i)
+			for t in item.Type:
+				self._categories.setdefault(t.lower(), set()).add(i)
+			for effect in item.Effects:
+				self._effects.setdefault(effect.lower(), set()).add(i)
+
+	def ids_to_items(self, ids: Iterable[int]) -> List[Item]:
+		"""The items of {ids} in catalog order."""
+		return self.graph.items_of(sorted(ids))
+
+	def name_contains(self, term: str) -> Set[int]:
+		"""Ids of the items whose name contains {term}, case-insensitively."""
+		term = term.lower()
+		if term == "":
+			return set(self.all_ids)
+		grams = _grams(term, min(len(term), GRAM))
+		candidates = set.intersection(*(self._name_grams.get(g, set()) for g in grams))
+		return {i for i in candidates if term in self.names_lower[i]}
+
+	def of_category(self, category: str) -> Set[int]:
+		"""Ids of the items having {category} as one of their types, case-insensitively."""
+		return set(self._categories.get(category.lower(), ()))
+
+	def with_effect(self, effect: str) -> Set[int]:
+		"""Ids of the items with an effect containing {effect}, case-insensitively."""
+		effect = effect.lower()
+		ids: Set[int] = set()
+		# there are far fewer distinct effects than items
+		for name, members in self._effects.items():
+			if effect in name:
+				ids |= members
+		return ids
+
+	def fuzzy_names(self, term: str, limit: int = 5, cutoff: float = 0.5,
+	                within: AbstractSet[int] | None = None) -> List[Tuple[float, int]]:
+		"""
+		The ids of up to {limit} items (of {within} if given) whose name is closest to
+		{term}, with their similarity (the Dice coefficient of the {FUZZY_GRAM}-grams of
+		both names), best first. Names scoring below {cutoff} are left out, so typos such as
+		"Natrual Cloth" resolve but unrelated names don't.
+		"""
+		if term == "":
+			return []
+		grams = _grams(f" {term.lower()} ", FUZZY_GRAM)
+		shared: Dict[int, int] = {}
+		for gram in grams:
+			for i in self._name_grams.get(gram, ()):
+				if within is not None and i not in within:
+					continue
+				shared[i] = shared.get(i, 0) + 1
+
+		ranked = []
+		for i, count in shared.items():
+			name_grams = len(_grams(f" {self.names_lower[i]} ", FUZZY_GRAM))
+			score = 2 * count / (len(grams) + name_grams)
+			if score >= cutoff:
+				ranked.append((score, i))
+		ranked.sort(key=lambda x: (-x[0], x[1]))
+		return ranked[:limit]
+
+# Indexes of the recent graphs, most recent last
+_recent_indexes: List[SearchIndex] = []
+
+def search_index_of(graph: RecipeGraph) -> SearchIndex:
+	"""The SearchIndex of {graph}, reusing a recently built index of {graph}."""
+	for index in _recent_indexes:
+		if index.graph is graph:
+			_recent_indexes.remove(index)
+			break
+	else:
+		index = SearchIndex(graph)
+	_recent_indexes.append(index)
+	del _recent_indexes[:-RECENT_GRAPHS]
+	return index
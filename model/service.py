@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import (AbstractSet, Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Tuple,
+                    Union)
+
+from model.components import components_of
+from model.cycles import iter_loop_ids
+from model.games import DEFAULT_GAME, GAMES, Game
+from model.graph import RecipeGraph
+from model.loops import rotations
+from model.search import SearchIndex
+
+@dataclass(frozen=True)
+class UsesQuery:
+	"""The names of the items using the item named {item} as ingredient, as `uses`."""
+	item: str
+
+@dataclass(frozen=True)
+class SearchQuery:
+	"""
+	The names of the items whose name contains {term}, or of the "(Category)" {term},
+	having the effect {effect} when given and only the craftable ones with {craftable},
+	as `search`.
+	"""
+	term: str = ""
+	effect: str | None = None
+	craftable: bool = False
+
+@dataclass(frozen=True)
+class LoopsQuery:
+	"""
+	The item names of the loops of {min_size} to {size} items (exactly {size} when
+	{min_size} is not given) through the item or "(Category)" {start}, or of the whole
+	catalog when None, that include all of {ingredients}, as `loops`: each loop once, or
+	once per rotation without {unique}, up to {limit} loops.
+	"""
+	size: int = 2
+	start: str | None = None
+	min_size: int | None = None
+	ingredients: Tuple[str, ...] = ()
+	limit: int | None = None
+	unique: bool = True
+
+	def __post_init__(self) -> None:
+		# the same ingredients in any order are the same query
+		object.__setattr__(self, "ingredients", tuple(sorted(set(self.ingredients))))
+
+Query = Union[UsesQuery, SearchQuery, LoopsQuery]
+
+# the in flight key of the catalog loading, equal to no query
+_CATALOG = object()
+
+class LoopFinder:
+	"""
+	Answers uses, search and loops queries of one game's catalog from an asyncio event
+	loop, one at a time or in batches, for services embedding the loop finder.
+
+	The catalog, its graph and search index are loaded once, by the first query, and
+	shared by every query after it. Uses and search queries are index lookups answered in
+	place, while loop searches run in {executor} (a thread pool of {max_workers} threads
+	by default), so the event loop keeps serving other queries during them. Identical
+	queries in flight are coalesced: the first is answered, and the others wait for its
+	answer instead of answering it again.
+	"""
+
+	def __init__(self, game: str = DEFAULT_GAME, executor: Executor | None = None,
+	             max_workers: int | None = None) -> None:
+		self.game: Game = GAMES[game]
+		self._owns_executor = executor is None
+		self.executor = executor if executor is not None else \
+			ThreadPoolExecutor(max_workers, thread_name_prefix="loop-finder")
+		self._catalog: Tuple[RecipeGraph, SearchIndex] | None = None
+		# key -> the task answering it, while in flight
+		self._in_flight: Dict[Hashable, asyncio.Future[Any]] = {}
+		# queries asked, and those coalesced with an identical query in flight
+		self.queries = 0
+		self.coalesced = 0
+
+	async def __aenter__(self) -> LoopFinder:
+		return self
+
+	async def __aexit__(self, *exc_info: Any) -> None:
+		self.close()
+
+	def close(self) -> None:
+		"""Shut down the executor, unless it was given, dropping the pending searches."""
+		if self._owns_executor:
+			self.executor.shutdown(wait=False, cancel_futures=True)
+
+	async def _coalesce(self, key: Hashable, answer: Callable[[], Awaitable[Any]]) -> Any:
+		"""The result of {answer}(), or of the task already in flight for {key}."""
+		future = self._in_flight.get(key)
+		if future is None:
+			future = asyncio.ensure_future(answer())
+			self._in_flight[key] = future
+			future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+		# a caller cancelled does not cancel the answer the others wait for
+		return await asyncio.shield(future)
+
+	async def catalog(self) -> Tuple[RecipeGraph, SearchIndex]:
+		"""The graph and search index of the catalog, loaded in the executor once."""
+		if self._catalog is None:
+			loop = asyncio.get_running_loop()
+			catalog = await self._coalesce(
+				_CATALOG, lambda: loop.run_in_executor(self.executor, self._load))
+			self._catalog = catalog
+		return self._catalog
+
+	def _load(self) -> Tuple[RecipeGraph, SearchIndex]:
+		graph = RecipeGraph(self.game.load().items)
+		# built once here rather than by the first loop searches
+		components_of(graph)
+		return graph, SearchIndex(graph)
+
+	async def query(self, query: Query) -> Any:
+		"""
+		The answer of {query}: a list of item names for UsesQuery and SearchQuery, and of
+		the item names of each loop for LoopsQuery. Raises ValueError for unknown items.
+		"""
+		self.queries += 1
+		if query in self._in_flight:
+			self.coalesced += 1
+		return await self._coalesce(query, lambda: self._answer(query))
+
+	async def batch(self, queries: Iterable[Query],
+	                return_exceptions: bool = False) -> List[Any]:
+		"""
+		The answers of {queries}, in order, answered concurrently (see query()). With
+		{return_exceptions}, the error of a failed query takes the place of its answer
+		instead of being raised.
+		"""
+		return list(await asyncio.gather(*map(self.query, queries),
+		                                 return_exceptions=return_exceptions))
+
+	async def _answer(self, query: Query) -> Any:
+		graph, index = await self.catalog()
+		if isinstance(query, LoopsQuery):
+			loop = asyncio.get_running_loop()
+			return await loop.run_in_executor(self.executor, answer_loops, graph, query)
+		if isinstance(query, UsesQuery):
+			return answer_uses(graph, query)
+		if isinstance(query, SearchQuery):
+			return answer_search(index, query)
+		raise TypeError(f"Not a query: {query!r}")
+
+def _id_named(graph: RecipeGraph, name: str) -> int:
+	position = graph.position.get(name)
+	if position is None:
+		raise ValueError(f"Item not found: {name}")
+	return position
+
+def answer_uses(graph: RecipeGraph, query: UsesQuery) -> List[str]:
+	"""The answer of a UsesQuery of {graph}."""
+	item = graph.items[_id_named(graph, query.item)]
+	return [consumer.Name for consumer in graph.consumers_of(item)]
+
+def answer_search(index: SearchIndex, query: SearchQuery) -> List[str]:
+	"""The answer of a SearchQuery of {index}."""
+	scope: AbstractSet[int] = index.craftable if query.craftable else index.all_ids
+	if query.effect is not None:
+		scope = index.with_effect(query.effect) & scope
+	if query.term.startswith("("):
+		matches = index.of_category(query.term)
+	else:
+		matches = index.name_contains(query.term)
+	return [item.Name for item in index.ids_to_items(matches & scope)]
+
+def answer_loops(graph: RecipeGraph, query: LoopsQuery) -> List[List[str]]:
+	"""The answer of a LoopsQuery of {graph}, searched with iter_loop_ids()."""
+	starting_ids: List[int] | None = None
+	if query.start is not None and query.start.startswith("("):
+		starting_ids = [graph.id_of(item) for item in graph.items_of_category(query.start)
+		                if len(item.Recipe) > 0]
+	elif query.start is not None:
+		starting_ids = [_id_named(graph, query.start)]
+	required_ids = [graph.position.get(name, -1) for name in query.ingredients]
+	if -1 in required_ids:
+		return []
+	loops = iter_loop_ids(graph, query.size, query.min_size, starting_ids, required_ids)
+	if not query.unique:
+		starting_set = None if starting_ids is None else set(starting_ids)
+		loops = (rotation for loop in loops for rotation in rotations(loop, starting_set))
+	return [[graph.items[i].Name for i in loop] for loop in islice(loops, query.limit)]
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from dataclasses import asdict
+from typing import List
+
+from pydantic import BaseModel
+
+from model.items import Model
+
+class ValidatedItem(BaseModel):
+	Name: str
+	Type: List[str]
+	Recipe: List[str]
+	Effects: List[str] = []
+
+def validate_model(model: Model) -> Model:
+	"""
+	Check every item of {model} against the pydantic schema of an Item.
+	Raises pydantic's ValidationError (a ValueError) on the first invalid item.
+	"""
+	for item in model.items:
+		ValidatedItem(**asdict(item))
+	return model
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, Iterable, List
+
+from model.graph import RECENT_GRAPHS
+
+if TYPE_CHECKING:
+	from model.graph import Adjacency
+
+def bits(mask: int) -> List[int]:
+	"""The ids set in {mask}, in increasing order."""
+	ids = []
+	while mask:
+		low = mask & -mask
+		ids.append(low.bit_length() - 1)
+		mask ^= low
+	return ids
+
+class WalkMatrix:
+	"""
+	The "uses" relation of an Adjacency (without repeated matches, self references and
+	disabled items) as a boolean matrix, each row being an int bitset of the items it
+	leads to. Reachability within k steps is k rounds of OR-ing rows, and the number of
+	closed walks of k steps through an item, an upper bound of its loops of k items,
+	is k sparse vector-matrix products, in exact integers.
+
+	This answers "how many / which" questions without enumerating every loop, see
+	loop_upper_bound() and cycle_candidates().
+	"""
+
+	def __init__(self, graph: Adjacency) -> None:
+		self.graph = graph
+		self.size = graph.size
+		disabled = graph.disabled
+		self.enabled = sum(1 << i for i in range(graph.size) if not disabled[i])
+		# row i: items using item i, column i: items used by item i
+		self.rows = [0] * graph.size
+		self.columns = [0] * graph.size
+		for i in range(graph.size):
+			if disabled[i]:
+				continue
+			for j in graph.succ_set[graph.succ_set_offsets[i]:graph.succ_set_offsets[i + 1]]:
+				if not disabled[j]:
+					self.rows[i] |= 1 << j
+					self.columns[j] |= 1 << i
+
+	def reach_levels(self, start_ids: Iterable[int], steps: int,
+	                 reverse: bool = False) -> List[int]:
+		"""
+		Bitsets of the items first reached from {start_ids} after 0, 1, ... {steps} "uses"
+		steps (or steps back to their ingredients with {reverse}), stopping early once
+		nothing new is reached.
+		"""
+		matrix = self.columns if reverse else self.rows
+		seen = frontier = sum(1 << i for i in dict.fromkeys(start_ids)) & self.enabled
+		levels = [frontier]
+		for _ in range(steps):
+			reached = 0
+			for i in bits(frontier):
+				reached |= matrix[i]
+			frontier = reached & ~seen
+			if not frontier:
+				break
+			seen |= frontier
+			levels.append(frontier)
+		return levels
+
+	def reachable(self, start_ids: Iterable[int], steps: int, reverse: bool = False) -> int:
+		"""Bitset of the items within {steps} steps of {start_ids}, see reach_levels()."""
+		reached = 0
+		for level in self.reach_levels(start_ids, steps, reverse):
+			reached |= level
+		return reached
+
+	def cycle_candidates(self, start: int, max_size: int) -> int:
+		"""
+		Bitset of the items that can be on a loop of at most {max_size} items through
+		{start}: the ones at distance d from {start} and at most max_size - d back to it.
+		"""
+		forward = self.reach_levels([start], max_size - 1)
+		backward = self.reach_levels([start], max_size - 1, reverse=True)
+		candidates = 0
+		for d, level in enumerate(forward):
+			for level_back in backward[:max_size - d + 1]:
+				candidates |= level & level_back
+		return candidates
+
+	def closed_walks(self, start: int, max_size: int, within: int | None = None) \
+		-> Dict[int, int]:
+		"""
+		The number of closed walks of each length from 2 to {max_size} from {start}
+		back to it, passing through {start} only at both ends and otherwise only through
+		the items of the {within} bitset (the cycle_candidates() by default). Every loop of
+		k items through {start} is one such walk of length k.
+		"""
+		if within is None:
+			within = self.cycle_candidates(start, max_size)
+		within &= self.enabled
+		if not within >> start & 1:
+			return {k: 0 for k in range(2, max_size + 1)}
+		rows = self.rows
+		walks: Dict[int, int] = {}
+		vector = {start: 1}
+		for k in range(1, max_size + 1):
+			next_vector: Dict[int, int] = {}
+			for i, count in vector.items():
+				for j in bits(rows[i] & within):
+					next_vector[j] = next_vector.get(j, 0) + count
+			vector = next_vector
+			if k >= 2:
+				walks[k] = vector.get(start, 0)
+			# walks past the start are only counted once back at it
+			vector.pop(start, None)
+		return walks
+
+	def loop_upper_bound(self, max_size: int, min_size: int | None = None,
+	                     starting_ids: Iterable[int] | None = None) -> int:
+		"""
+		An upper bound of the loops of {min_size} to {max_size} items through any of
+		{starting_ids}, or of the whole catalog: the number of closed walks through each
+		starting item (through the smallest id of each loop, for the whole catalog).
+		"""
+		min_size = max_size if min_size is None else min_size
+		bound = 0
+		if starting_ids is None:
+			for start in range(self.size):
+				# the loops of the whole catalog are counted once, from their smallest id
+				above = self.enabled >> start << start
+				within = self.cycle_candidates(start, max_size) & above
+				walks = self.closed_walks(start, max_size, within)
+				bound += sum(walks[k] for k in range(min_size, max_size + 1))
+		else:
+			for start in dict.fromkeys(starting_ids):
+				walks = self.closed_walks(start, max_size)
+				bound += sum(walks[k] for k in range(min_size, max_size + 1))
+		return bound
+
+# Matrices of the recent graphs, most recent last
+_recent_matrices: List[WalkMatrix] = []
+
+def walk_matrix_of(graph: Adjacency) -> WalkMatrix:
+	"""The WalkMatrix of {graph}, reusing a recently built matrix of {graph}."""
+	for matrix in _recent_matrices:
+		if matrix.graph is graph:
+			_recent_matrices.remove(matrix)
+			break
+	else:
+		matrix = WalkMatrix(graph)
+	_recent_matrices.append(matrix)
+	del _recent_matrices[:-RECENT_GRAPHS]
+	return matrix
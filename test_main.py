@@ -1,12 +1,562 @@
+import asyncio
+import json
+import os
+
+import pytest
+from click.testing import CliRunner
+
 import main
+import model
 
+def use_test_game(monkeypatch, *files):
+    """Register a game of {files} named "test" for the duration of the test."""
+    game = model.Game("test", "Test", tuple(map(str, files)), model.ryza_csv_load_strategy)
+    monkeypatch.setitem(model.GAMES, "test", game)
+    monkeypatch.setattr(main, "game_name", "test")
+    return game
 
+def load_items():
+    recipes = model.load_csv_data("assets/ryza_2_recipes.csv", model.ryza_csv_load_strategy)
+    return recipes.items
 
+def scan_is_used_as_ingredient_of(item, items):
+    matches = []
+    for i in items:
+        if item == i:
+            continue
+        if item.Name in i.Recipe:
+            matches.append(i)
+            continue
+        for t in item.Type:
+            if t in i.Recipe:
+                matches.append(i)
+    return matches
 
+def scan_ingredients_of(item, items):
+    matches = []
+    for i in items:
+        if i.Name in item.Recipe:
+            matches.append(i)
+            continue
+        for t in item.Recipe:
+            if t in i.Type:
+                matches.append(i)
+    return matches
 
+def test_find_recipe_matches():
+    items = load_items()
+    flour = main.find_item_named("Flour", items)
+    matches = main.find_is_used_as_ingredient_of(flour, items)
+    assert len(matches) > 0
+    assert all("Flour" in i.Recipe or set(flour.Type) & set(i.Recipe) for i in matches)
 
+def test_recipe_graph_matches_full_scan():
+    items = load_items()
+    for item in items:
+        assert main.find_is_used_as_ingredient_of(item, items) == \
+               scan_is_used_as_ingredient_of(item, items)
+        assert main.find_ingredients_of(item, items) == scan_ingredients_of(item, items)
+    assert main.find_items_of_type("(gas)", items) == \
+           [i for i in items if "(gas)" in [t.lower() for t in i.Type]]
 
+    # filtered lists are looked up in the graph of the items, not indexed anew
+    remaining = items[::2]
+    graph = model.graph_of(items)
+    for item in items[:20]:
+        assert main.find_is_used_as_ingredient_of(item, remaining) == \
+               scan_is_used_as_ingredient_of(item, remaining)
+        assert main.find_ingredients_of(item, remaining) == \
+               scan_ingredients_of(item, remaining)
+    assert model.graph_holding(remaining)[0] is graph
 
+def test_find_looping_sequences_from_item():
+    items = load_items()
+    flour = main.find_item_named("Flour", items)
+    remaining = [i for i in items if i != flour]
+    loops = main.find_looping_sequences([flour], 3, main.find_ingredients_of(flour, remaining),
+                                        remaining)
+    assert len(loops) == 15
+    for loop in loops:
+        assert loop[0] == flour
+        round_loop = loop + [loop[0]]
+        for a, b in zip(round_loop, round_loop[1:]):
+            main.item_uses_ingredient(b, a)
 
-def test_find_recipe_matches():
-    assert False
+def test_loop_ids_match_item_search():
+    items = load_items()
+    graph = model.RecipeGraph(items)
+    loops = main.find_looping_sequences([], 3, [], items)
+    assert [graph.items_of(loop) for loop in
+            model.find_loop_ids(graph, 3, range(graph.size))] == loops
+
+def canonical(loop):
+    i = loop.index(min(loop))
+    return loop[i:] + loop[:i]
+
+def test_find_cycle_ids_emits_each_loop_once():
+    graph = model.RecipeGraph(load_items())
+    for size in (2, 3, 4):
+        cycles = model.find_cycle_ids(graph, size)
+        assert len(cycles) == len(set(cycles))
+        assert set(cycles) == {canonical(loop) for loop in
+                               model.find_loop_ids(graph, size, range(graph.size))}
+    assert len(model.find_cycle_ids(graph, 4, 2)) == \
+           sum(len(model.find_cycle_ids(graph, size)) for size in (2, 3, 4))
+
+def test_loops_command_streams_up_to_limit():
+    result = CliRunner().invoke(main.cli, ["--no-cache", "loops", "--size=4", "--limit=3",
+                                           "-S"])
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert len(lines) == 4
+    assert lines[-1] == "Found 3 loops of size 4"
+    for args in (["loops", "-l", "-1"], ["loops", "-j", "0"], ["best-loops", "-k", "-1"]):
+        result = CliRunner().invoke(main.cli, ["--no-cache", *args])
+        assert result.exit_code == 2 and "is not in the range" in result.output
+
+def test_required_ingredients_match_post_filter():
+    graph = model.RecipeGraph(load_items())
+    required = [graph.position["Flour"], graph.position["Dry Powder"]]
+    for size in (3, 4):
+        loops = model.find_cycle_ids(graph, size, 2)
+        expected = [loop for loop in loops if all(r in loop for r in required)]
+        assert len(expected) > 0
+        assert model.find_cycle_ids(graph, size, 2, required) == expected
+
+def test_parallel_search_matches_sequential():
+    graph = model.RecipeGraph(load_items())
+    assert list(model.iter_cycle_ids_parallel(graph, 2, 4)) == model.find_cycle_ids(graph, 4)
+    gases = [graph.id_of(i) for i in graph.items_of_category("(Gas)")]
+    assert list(model.iter_cycle_ids_parallel(graph, 2, 3, 2, (), gases)) == \
+           model.find_cycle_ids_through(graph, gases, 3, 2)
+
+def test_unique_loops_expand_to_every_rotation():
+    items = load_items()
+    graph = model.graph_of(items)
+    fuel = main.find_items_of_type("(Fuel)", items)
+    starting_ids = [graph.id_of(item) for item in fuel]
+    for size in (2, 3, 4):
+        rotated = model.find_cycle_ids_through(graph, starting_ids, size)
+        unique = model.find_cycle_ids_through(graph, starting_ids, size, unique=True)
+        assert len(set(map(model.canonical_rotation, unique))) == len(unique)
+        assert sorted(main.expand_rotations(unique, starting_ids)) == sorted(rotated)
+
+    catalog_wide = model.find_cycle_ids(graph, 3)
+    rotations = [r for loop in catalog_wide for r in model.rotations(loop)]
+    every_start = model.find_cycle_ids_through(graph, range(graph.size), 3)
+    assert sorted(rotations) == sorted(every_start)
+
+    result = CliRunner().invoke(main.cli, ["--no-cache", "loops", "-s", "4", "(Fuel)"])
+    assert "Found 4827 loops of size 4" in result.output
+    result = CliRunner().invoke(main.cli, ["--no-cache", "loops", "-s", "4",
+                                           "--rotations", "-f", "csv", "(Fuel)"])
+    assert len(result.stdout.splitlines()) == 7288
+
+def test_best_loops_match_ranking_every_loop():
+    items = load_items()
+    graph = model.graph_of(items)
+    assert model.effect_level("Synth Quantity +2") == ("Synth Quantity", 2)
+    for weights in (None, {"synth": 2.0, "spread": 1.0}):
+        scores = model.item_scores(items, weights)
+        for size, min_size in ((3, None), (4, 2)):
+            loops = model.find_cycle_ids(graph, size, min_size)
+            ranked = sorted((sum(scores[i] for i in loop) for loop in loops), reverse=True)
+            best = model.best_cycle_ids(graph, scores, 5, size, min_size)
+            assert [score for score, _ in best] == ranked[:5]
+            assert all(loop in loops and sum(scores[i] for i in loop) == score
+                       for score, loop in best)
+
+    result = CliRunner().invoke(main.cli, ["--no-cache", "best-loops", "-k", "2", "-s", "4",
+                                           "-e", "synth=2", "-f", "jsonl", "Flour"])
+    lines = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [line["score"] for line in lines] == [16, 12]
+    assert all(line["loop"][0] == "Flour" for line in lines)
+    result = CliRunner().invoke(main.cli, ["--no-cache", "best-loops", "Nope"])
+    assert result.exit_code == 2 and "Item not found: Nope" in result.output
+
+def test_paths_are_the_shortest_sequences():
+    items = load_items()
+    graph = model.graph_of(items)
+    cloth, zettel = graph.position["Cloth"], graph.position["Zettel"]
+    shortest = model.shortest_path_ids(graph, cloth, zettel, 6)
+    assert len(shortest) == 3 and shortest[0] == cloth and shortest[-1] == zettel
+    assert model.shortest_path_ids(graph, cloth, zettel, 1) is None
+
+    # paths of up to 3 crafts are the sequences of up to 4 items ending in Zettel
+    sequences = [tuple(graph.id_of(item) for item in sequence) for size in (3, 4)
+                 for sequence in main.find_looping_sequences(
+                     [items[cloth]], size, [items[zettel]], items, graph)]
+    paths = list(model.iter_path_ids(graph, cloth, zettel, 3))
+    assert paths == sorted(sequences, key=lambda path: (len(path), path))
+    assert shortest in paths and model.find_path_ids(graph, cloth, zettel, 3, 2) == paths[:2]
+
+    result = CliRunner().invoke(main.cli, ["--no-cache", "path", "-S", "-l", "2",
+                                           "Cloth", "Zettel"])
+    assert result.output.splitlines() == [
+        "Cloth -> Green Neutralizer -> Zettel",
+        "Cloth -> Flour -> Red Neutralizer -> Zettel",
+        "Found 2 paths from Cloth to Zettel"]
+    result = CliRunner().invoke(main.cli, ["--no-cache", "path", "-l", "0", "Cloth", "Zettel"])
+    assert result.exit_code == 2 and "No way to craft" not in result.output
+
+def test_components_hold_every_loop():
+    items = load_items()
+    graph = model.graph_of(items)
+    components = model.components_of(graph)
+    assert components is model.components_of(graph)
+    assert [len(ids) for ids in components.members()][:2] == [132, 1]
+    for loop in model.find_cycle_ids(graph, 4, 2):
+        assert len({components.of[i] for i in loop}) == 1
+        assert all(components.on_loops(i) for i in loop)
+
+    # disabling an item splits its component, and the components are rebuilt
+    flour = graph.position["Flour"]
+    graph.disabled[flour] = 1
+    try:
+        rebuilt = model.components_of(graph)
+        assert rebuilt is not components and not rebuilt.on_loops(flour)
+        reach = model.WalkMatrix(graph)
+        for i in range(0, graph.size, 7):
+            if graph.disabled[i]:
+                continue
+            both_ways = reach.reachable([i], graph.size) & \
+                reach.reachable([i], graph.size, reverse=True)
+            assert model.bits(both_ways) == [j for j in range(graph.size)
+                                             if rebuilt.of[j] == rebuilt.of[i]]
+    finally:
+        graph.disabled[flour] = 0
+
+    result = CliRunner().invoke(main.cli, ["--no-cache", "components", "-n"])
+    assert result.output == "132 items\nFound 1 group of items on loops, " \
+                            "48 items are on no loop\n"
+
+def test_catalog_cache_reuses_catalog_and_loop_results(tmp_path):
+    cache = model.CatalogCache(tmp_path)
+    catalog = cache.load_catalog("assets/ryza_2_recipes.csv", model.ryza_csv_load_strategy)
+    assert catalog.model.items == load_items()
+    query = {"size": 3}
+    assert catalog.cached_loops(query) is None
+    graph = model.RecipeGraph(catalog.model.items)
+    loops = list(catalog.memoize_loops(query, model.iter_cycle_ids(graph, 3)))
+
+    reloaded = cache.load_catalog("assets/ryza_2_recipes.csv", model.ryza_csv_load_strategy)
+    assert reloaded.key == catalog.key
+    assert reloaded.cached_loops(query) == loops
+
+    model.CatalogCache(tmp_path, max_bytes=0).evict()
+    assert reloaded.cached_loops(query) == loops  # still in memory
+    assert cache.load_catalog("assets/ryza_2_recipes.csv",
+                              model.ryza_csv_load_strategy).cached_loops(query) is None
+
+    # results past max_loops are streamed without being kept
+    small = model.CatalogCache(tmp_path, max_loops=len(loops) - 1)
+    catalog = small.load_catalog("assets/ryza_2_recipes.csv", model.ryza_csv_load_strategy)
+    assert list(catalog.memoize_loops(query, iter(loops))) == loops
+    assert catalog.cached_loops(query) is None
+
+def test_unwritable_cache_falls_back_to_uncached(tmp_path, monkeypatch):
+    # a cache directory under a file can't be created, whatever the permissions
+    unwritable = tmp_path / "file" / "cache"
+    (tmp_path / "file").write_text("")
+    monkeypatch.setattr(main, "loaded_catalogs", {})
+    result = CliRunner().invoke(main.cli, ["--cache-dir", str(unwritable), "search",
+                                           "cloth"])
+    assert result.exit_code == 0 and "Found 2 items named cloth" in result.output
+    assert result.output.count("Warning: not caching") == 1
+    monkeypatch.setattr(main, "loaded_catalogs", {})
+    result = CliRunner().invoke(main.cli, ["--cache-dir", str(unwritable), "loops", "-s",
+                                           "3", "Flour"])
+    assert result.exit_code == 0 and "Found 14 loops of size 3" in result.output
+
+def test_validate_model():
+    catalog = model.load_csv_data("assets/ryza_2_recipes.csv", model.ryza_csv_load_strategy)
+    assert model.validate_model(catalog) is catalog
+    catalog.items.append(model.Item(Name="Broken", Type=[None], Recipe=[]))
+    try:
+        model.validate_model(catalog)
+        assert False, "expected a validation error"
+    except ValueError:
+        pass
+
+def test_synthetic_catalog_round_trips_through_csv(tmp_path):
+    from benchmarks.synthetic import generate_catalog, write_catalog_csv
+    catalog = generate_catalog(items=50, categories=8, fanout=3, ingredients=6, seed=1)
+    assert catalog == generate_catalog(items=50, categories=8, fanout=3, ingredients=6,
+                                       seed=1)
+    write_catalog_csv(catalog, tmp_path / "synthetic.csv")
+    loaded = model.load_csv_data(str(tmp_path / "synthetic.csv"),
+                                 model.ryza_2_csv_load_strategy)
+    assert loaded == catalog
+
+def test_streamed_catalogs_match_loaded_ones(tmp_path):
+    from benchmarks.synthetic import generate_catalog, write_datamined_csv
+
+    ryza = model.GAMES["ryza"]
+    graph, stats = model.ingest_csv_files(ryza.files, model.ryza_csv_row_parser, 100)
+    expected = model.RecipeGraph(ryza.load().items)
+    assert graph.items == expected.items
+    assert all(getattr(graph, f) == getattr(expected, f) for f in expected.fields)
+    assert graph.edge_labels == expected.edge_labels
+    assert (stats.rows, stats.items, stats.chunks) == (403, 403, 5)
+    assert stats.rows_per_second > 0
+
+    catalog = generate_catalog(200, 20, 2, 4, seed=3)
+    write_datamined_csv(catalog, tmp_path / "dump.csv", ingredient_sets=8)
+    chunks = list(model.iter_item_chunks([str(tmp_path / "dump.csv")],
+                                         model.datamined_csv_row_parser, 64))
+    assert [len(chunk) for chunk in chunks] == [64, 64, 64, 8]
+    items = [item for chunk in chunks for item in chunk]
+    assert [(i.Name, i.Type, i.Recipe) for i in items] == \
+           [(i.Name, i.Type, i.Recipe) for i in catalog.items]
+
+    result = CliRunner().invoke(main.cli, ["ingest", "-f", "datamined", "--chunk-size",
+                                           "64", str(tmp_path / "dump.csv")])
+    assert result.output.startswith("Indexed 200 items from 200 rows in 4 chunks")
+    assert "rows/s" in result.output
+    result = CliRunner().invoke(main.cli, ["ingest", "-f", "datamined", "--chunk-size",
+                                           "0", str(tmp_path / "dump.csv")])
+    assert result.exit_code == 2 and "Indexed" not in result.output
+    with pytest.raises(ValueError):
+        next(model.iter_item_chunks([str(tmp_path / "dump.csv")],
+                                    model.datamined_csv_row_parser, 0))
+
+def test_shell_reuses_catalog_until_csv_changes(tmp_path, monkeypatch):
+    csv_file = tmp_path / "recipes.csv"
+    csv_file.write_text(open("assets/ryza_2_recipes.csv").read())
+    use_test_game(monkeypatch, csv_file)
+    result = CliRunner().invoke(main.cli, ["--no-cache", "-g", "test", "shell"],
+                                input="search cloth\nuses -i Nope\nloops -s 3 -S Flour\n")
+    assert result.exit_code == 0
+    assert "Found 2 items named cloth" in result.output
+    assert "Found 14 loops of size 3" in result.output
+
+    items = main.get_all_items()
+    assert main.get_all_items() is items
+    with open(csv_file, "a") as f:
+        f.write("New Item,(Cloth),,,,,,,,,,,Flour\n")
+    os.utime(csv_file, ns=(0, 0))
+    reloaded = main.get_all_items()
+    assert reloaded is not items
+    assert reloaded[-1].Name == "New Item"
+
+def test_incremental_loops_follow_include_column(tmp_path, monkeypatch):
+    import csv
+    with open("assets/ryza_2_recipes.csv", newline='') as f:
+        rows = list(csv.DictReader(f))
+    fieldnames = ["Include", *rows[0]]
+    csv_file = tmp_path / "recipes.csv"
+
+    def write(excluded):
+        with open(csv_file, "w", newline='') as f:
+            writer = csv.DictWriter(f, fieldnames)
+            writer.writeheader()
+            for i, row in enumerate(rows):
+                writer.writerow({"Include": "" if i in excluded else "X", **row})
+
+    def full_search():
+        graph = model.RecipeGraph(model.load_csv_data(
+            str(csv_file), model.ryza_csv_load_strategy).items)
+        return {tuple(graph.items[i].Name for i in loop)
+                for loop in model.find_cycle_ids(graph, 3, 2)}
+
+    incremental = model.IncrementalCatalog([str(csv_file)], model.ryza_csv_load_strategy)
+    write({0, 5, 17, 40})
+    incremental.refresh()
+    assert incremental.loop_changes(3, 2).baseline
+    before = full_search()
+    for excluded in ({5, 17, 40, 41, 60}, {0, 41}, set()):
+        write(excluded)
+        incremental.refresh()
+        changes = incremental.loop_changes(3, 2)
+        after = full_search()
+        names = lambda loops: {tuple(incremental.graph.items[i].Name for i in loop)
+                               for loop in loops}
+        assert names(changes.new) == after - before
+        assert names(changes.gone) == before - after
+        assert names(changes.loops) == after
+        before = after
+
+    use_test_game(monkeypatch, csv_file)
+    result = CliRunner().invoke(main.cli, ["--no-cache", "-g", "test", "shell"],
+                                input="loops -u -s 3 -c\nloops -u -s 3 -c\n")
+    assert result.exit_code == 0
+    assert f"Recorded {len(before)} loops" in result.output
+    assert f"0 new and 0 gone loops, {len(before)} in total" in result.output
+
+def test_search_index_matches_full_scan():
+    items = load_items()
+    index = model.search_index_of(model.graph_of(items))
+    for term in ["", "c", "cl", "cloth", "WEISE CLOTH", "h ", "nope"]:
+        assert index.ids_to_items(index.name_contains(term)) == \
+               [i for i in items if term.lower() in i.Name.lower()]
+    assert index.ids_to_items(index.of_category("(GAS)")) == \
+           main.find_items_of_type("(gas)", items)
+    assert index.ids_to_items(index.with_effect("spread +2")) == \
+           [i for i in items if any("spread +2" in e.lower() for e in i.Effects)]
+
+    (score, best), *_ = index.fuzzy_names("Weiss Clth")
+    assert items[best].Name == "Weise Cloth"
+    assert index.fuzzy_names("xq") == []
+    result = CliRunner().invoke(main.cli, ["--no-cache", "search", "Flur"])
+    assert "Closest matches to Flur" in result.output and "Flour" in result.output
+
+def test_walk_matrix_bounds_loops_and_matches_reachability():
+    graph = model.graph_of(load_items())
+    walks = model.walk_matrix_of(graph)
+    flour = graph.position["Flour"]
+    for size in (2, 3, 4):
+        exact = len(model.find_cycle_ids(graph, size))
+        bound = walks.loop_upper_bound(size)
+        # walks of up to 3 items back to the start can't repeat an item
+        assert bound == exact if size <= 3 else bound >= exact
+        assert walks.loop_upper_bound(size, starting_ids=[flour]) >= \
+               len(model.find_cycle_ids_through(graph, [flour], size))
+    for item in range(0, graph.size, 7):
+        distance = model.distances_to(graph, item, 3)
+        for steps, level in enumerate(walks.reach_levels([item], 3, reverse=True)):
+            assert model.bits(level) == [i for i in range(graph.size)
+                                         if distance[i] == steps]
+
+    result = CliRunner().invoke(main.cli, ["--no-cache", "loops", "-n", "-s", "3"])
+    assert "At most 842 loops of size 3\nFound 842 loops of size 3" in result.output
+    result = CliRunner().invoke(main.cli, ["--no-cache", "reach", "-r", "-k", "1", "Flour"])
+    assert "Found 7 items that can be made into Flour within 1 steps" in result.output
+
+def test_mutual_pairs_match_loops_of_two():
+    items = load_items()
+    graph = model.graph_of(items)
+    assert list(model.iter_mutual_pairs(graph)) == model.find_cycle_ids(graph, 2)
+    flour = graph.position["Flour"]
+    assert list(model.iter_mutual_pairs(graph, [flour], [flour])) == \
+           model.find_cycle_ids_through(graph, [flour], 2, required_ids=[flour])
+
+    pairs = main.find_bidirectional_related_pairs(items)
+    assert len(pairs) == len({frozenset((a.item.Name, a.ingredient.Name))
+                              for a, _ in pairs}) == 112
+    for uses_a, uses_b in pairs:
+        assert (uses_a.item, uses_a.ingredient) == (uses_b.ingredient, uses_b.item)
+        assert uses_a.MatchingIngredientRequirement in uses_a.item.Recipe
+        assert uses_b.MatchingIngredientRequirement in uses_b.item.Recipe
+
+def test_edge_labels_match_item_uses_ingredient():
+    items = load_items()
+    graph = model.graph_of(items)
+    assert len(graph.edge_labels) == len(graph.succ_set)
+    for (consumer, ingredient), label in graph.edge_labels.items():
+        relation = main.item_uses_ingredient(items[consumer], items[ingredient])
+        assert label == (relation.MatchingIngredientRequirement,
+                         relation.MatchingIngredientType)
+    for loop in model.find_cycle_ids(graph, 3)[:200]:
+        loop_items = graph.items_of(loop)
+        assert main.explain_loop(loop_items, graph) == main.explain_loop(loop_items)
+
+def test_loops_machine_readable_formats(monkeypatch):
+    import csv
+    import io
+    import json
+    runner = CliRunner()
+    result = runner.invoke(main.cli, ["--no-cache", "loops", "-s", "3", "-f", "jsonl",
+                                      "Flour"])
+    loops = [json.loads(line) for line in result.stdout.splitlines()]
+    assert len(loops) == 14 and loops[0][0] == "Flour"
+    assert "Found 14 loops of size 3" in result.stderr
+
+    result = runner.invoke(main.cli, ["--no-cache", "loops", "-s", "3", "-f", "csv",
+                                      "--ids"])
+    graph = model.graph_of(main.get_all_items())
+    rows = [tuple(map(int, row)) for row in csv.reader(io.StringIO(result.stdout))]
+    assert rows == model.find_cycle_ids(graph, 3)
+
+    result = runner.invoke(main.cli, ["--no-cache", "loops", "-s", "3", "Flour"])
+    assert "\x1b[" not in result.stdout and "- Flour[" in result.stdout
+    # styled as the context's color setting says, e.g. click's Context(color=True)
+    monkeypatch.setitem(main.cli.context_settings, "color", True)
+    result = runner.invoke(main.cli, ["--no-cache", "loops", "-s", "3", "Flour"],
+                           color=True)
+    assert "\x1b[" in result.stdout
+
+def test_profile_reports_phases_and_search_counters(tmp_path):
+    counters = model.counters
+    counters.reset()
+    assert not counters.enabled
+    items = load_items()
+    main.find_looping_sequences([], 3, [], items)
+    assert counters.counts == {}
+
+    result = CliRunner().invoke(main.cli, [
+        "--no-cache", "--profile-output", str(tmp_path / "loops.pstats"),
+        "loops", "-s", "3", "Flour"])
+    assert result.exit_code == 0
+    assert "Found 14 loops of size 3" in result.stdout
+    for line in ["load catalog", "search", "output", "dfs.visited", "dfs.pruned"]:
+        assert line in result.stderr
+    assert (tmp_path / "loops.pstats").stat().st_size > 0
+    assert not counters.enabled
+
+    # the counts of the worker processes add up to the sequential ones
+    reports = [CliRunner().invoke(main.cli, ["--no-cache", "--profile", "loops", "-s", "4",
+                                             "-j", jobs, "-n"]).stderr
+               for jobs in ["1", "2"]]
+    counts = [[line for line in report.splitlines() if "dfs." in line]
+              for report in reports]
+    assert counts[0] and counts[0] == counts[1]
+    assert "Peak memory of a worker" in reports[1]
+
+    counters.reset()
+    counters.enabled = True
+    try:
+        with counters.phase("outer"):
+            main.find_looping_sequences([], 3, [], items)
+    finally:
+        counters.enabled = False
+    assert counters.counts["dfs.visited"] > 0 and counters.counts["dfs.pruned"] > 0
+    assert set(counters.phases) == {"outer"}
+
+def test_games_load_concurrently_and_stay_loaded(tmp_path, monkeypatch):
+    ryza = model.GAMES["ryza"]
+    items = ryza.load().items
+    assert items == [item for file in ryza.files
+                     for item in model.load_csv_data(file, ryza.strategy).items]
+    assert items[0].Name == "Clean Water" and len(items) == 403
+
+    cache = model.CatalogCache(tmp_path)
+    assert cache.load_catalogs(ryza.files, ryza.strategy).model == ryza.load()
+    assert cache.load_catalogs(ryza.files, ryza.strategy).model == ryza.load()
+    assert cache.load_catalogs(ryza.files[:1], ryza.strategy).model.items == \
+           items[:218]
+
+    result = CliRunner().invoke(main.cli, ["--cache-dir", str(tmp_path), "shell"],
+                                input="loops -n -s 3\ngame ryza\nloops -n -s 3\n"
+                                      "game ryza_2\n")
+    assert "Found 842 loops of size 3" in result.output
+    assert "Found 221 loops of size 3" in result.output
+    assert set(main.loaded_catalogs) == {"ryza_2", "ryza"}
+    ryza_2_items = main.loaded_catalogs["ryza_2"].items
+    assert main.get_all_items() is ryza_2_items
+    assert model.graph_of(ryza_2_items) is model.graph_of(ryza_2_items)
+
+def test_service_batches_share_the_catalog_and_coalesce_queries():
+    flour_loops = model.LoopsQuery(size=3, start="Flour")
+    queries = [flour_loops, model.UsesQuery("Air Drop"), flour_loops,
+               model.SearchQuery("cloth", craftable=True), flour_loops,
+               model.LoopsQuery(size=2, ingredients=("Nope",)), model.UsesQuery("Nope")]
+
+    async def answer():
+        async with model.LoopFinder() as finder:
+            answers = await finder.batch(queries, return_exceptions=True)
+            return finder, answers, await finder.catalog()
+
+    finder, answers, (graph, _) = asyncio.run(answer())
+    assert finder.queries == 7 and finder.coalesced == 2
+    assert answers[0] is answers[2] is answers[4]
+    result = CliRunner().invoke(main.cli, ["--no-cache", "loops", "-s", "3", "Flour",
+                                           "-f", "jsonl"])
+    assert answers[0] == [json.loads(line) for line in result.output.splitlines()
+                          if line.startswith("[")]
+    assert answers[1] == [item.Name for item in
+                          graph.consumers_of(graph.by_name["Air Drop"])]
+    assert answers[3] == ["Cloth", "Weise Cloth"]
+    assert answers[5] == []
+    assert isinstance(answers[6], ValueError)
+    assert model.LoopsQuery(3, ingredients=("b", "a", "b")) == \
+           model.LoopsQuery(3, ingredients=("a", "b"))